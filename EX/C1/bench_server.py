@@ -0,0 +1,74 @@
+#!/usr/bin/python3
+# Load test for server.py: requests/second in serial mode vs concurrent modes
+# Launches server.py once per worker count and hits it with many concurrent clients
+
+import jsockets
+import sys, os, time, subprocess, argparse, threading
+
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server.py')
+
+def client(port, n_requests, latencies, errors):
+    for i in range(n_requests):
+        start = time.perf_counter()
+        sock = jsockets.socket_tcp_connect('localhost', port)
+        if sock is None:
+            errors.append('could not open socket')
+            continue
+        data = sock.recv(jsockets.BUFSIZE)
+        sock.close()
+        if data:
+            latencies.append(time.perf_counter() - start)
+        else:
+            errors.append('empty answer')
+
+def wait_listening(port, timeout=5.0):
+    end = time.time() + timeout
+    while time.time() < end:
+        sock = jsockets.socket_tcp_connect('localhost', port)
+        if sock is not None:
+            sock.close()
+            return True
+        time.sleep(0.05)
+    return False
+
+def run(workers, args):
+    cmd = [sys.executable, SERVER, str(args.port), '--workers', str(workers), '--max-delay', str(args.max_delay),
+           '--cache-ttl', str(args.cache_ttl)]
+    server = subprocess.Popen(cmd, stdout=subprocess.DEVNULL)
+    try:
+        if not wait_listening(args.port):
+            print(f'server did not start (workers={workers})')
+            sys.exit(1)
+        time.sleep(args.max_delay) # the probe connection above gets served too
+        latencies, errors = [], []
+        threads = [threading.Thread(target=client, args=(args.port, args.requests, latencies, errors)) for i in range(args.clients)]
+        start = time.perf_counter()
+        for t in threads: t.start()
+        for t in threads: t.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+    latencies.sort()
+    p50 = latencies[len(latencies)//2] if latencies else float('nan')
+    worst = latencies[-1] if latencies else float('nan')
+    return len(latencies)/elapsed, p50, worst, len(errors)
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test for server.py')
+    parser.add_argument('--port', type=int, default=9000, help='Port for the server under test')
+    parser.add_argument('-c', '--clients', type=int, default=20, help='Concurrent clients')
+    parser.add_argument('-n', '--requests', type=int, default=5, help='Requests per client')
+    parser.add_argument('--max-delay', type=float, default=0.2, help='Maximum calc() delay, in seconds')
+    parser.add_argument('--cache-ttl', type=float, default=0, help='Passed to server.py (0: no cache)')
+    parser.add_argument('-w', '--workers', type=int, nargs='+', default=[1, 4, 16, 64], help='Worker counts to compare (1: serial)')
+    args = parser.parse_args()
+
+    print(f'{args.clients} clients x {args.requests} requests, calc() up to {args.max_delay}s')
+    print(f'{"workers":>8} {"req/s":>10} {"p50":>9} {"max":>9} {"errors":>7}')
+    for workers in args.workers:
+        rps, p50, worst, errors = run(workers, args)
+        print(f'{workers:>8} {rps:>10.1f} {1000*p50:>7.0f}ms {1000*worst:>7.0f}ms {errors:>7}')
+
+if __name__ == '__main__':
+    main()
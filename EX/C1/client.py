@@ -1,55 +1,106 @@
 #!/usr/bin/python3
 
 import jsockets
-import sys, threading
+import time, socket, argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError
 
-return_value = []
-
-class Client(threading.Thread):
-    def __init__(self, addr, port):
-        threading.Thread.__init__(self)
+class Client:
+    def __init__(self, addr, port, timeout):
         self.addr = addr
         self.port = port
+        self.timeout = timeout
+        self.sock = None
+        self.cancelled = False
 
     def __str__(self):
         return f'Server [{self.addr}:{self.port}]'
 
-    def run(self):
-        sock = jsockets.socket_tcp_connect(self.addr, self.port)
-        
-        if sock is None:
-            print(f'{self} could not open socket')
-            return
-
+    def query(self) -> float:
+        # the per-server timeout covers both connect and the answer
+        deadline = time.monotonic() + self.timeout
+        self.sock = jsockets.socket_tcp_connect(self.addr, self.port, timeout=self.timeout, happy_eyeballs=True)
+        if self.sock is None:
+            raise ConnectionError('could not open socket')
+        if self.cancelled:
+            self.sock.close()
+            raise ConnectionError('cancelled')
         print(f'{self} connected')
-        data = sock.recv(1024)
+        try:
+            self.sock.settimeout(max(deadline - time.monotonic(), 0.001))
+            data = self.sock.recv(jsockets.BUFSIZE)
+        except socket.timeout:
+            raise TimeoutError(f'no answer after {self.timeout}s')
+        finally:
+            self.sock.close()
+        if self.cancelled:
+            raise ConnectionError('cancelled')
         print(f'{self} read {data}')
-        sock.close()
         try:
-            return_value.append(float(data.decode('UTF-8')))
-        except:
-            print(f'{self} could not convert data to float, unknown error')
+            return float(data.decode('UTF-8'))
+        except ValueError:
+            raise ValueError(f'could not convert {data} to float')
+
+    def cancel(self):
+        # wakes up a blocked recv, so nobody waits for a server we no longer need
+        self.cancelled = True
+        if self.sock is not None:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+def argument_parser() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Average of the values returned by several servers')
+    parser.add_argument('servers', nargs='+', help='host port [host port] ...')
+    parser.add_argument('-t', '--timeout', type=float, default=5.0, help='Timeout for each server, in seconds')
+    parser.add_argument('-d', '--deadline', type=float, default=None, help='Global deadline, in seconds (default: none)')
+    parser.add_argument('-k', '--first', type=int, default=None, help='Return as soon as k servers answered (default: all)')
+    args = parser.parse_args()
+    if len(args.servers) % 2 != 0:
+        parser.error('servers must be given as host port pairs')
+    n_servers = len(args.servers) // 2
+    if args.first is None:
+        args.first = n_servers
+    if not 1 <= args.first <= n_servers:
+        parser.error(f'k must be between 1 and {n_servers}')
+    if args.timeout <= 0 or (args.deadline is not None and args.deadline <= 0):
+        parser.error('timeout and deadline must be greater than 0')
+    return args
+
 # main
 def main():
-    if len(sys.argv) < 3 or len(sys.argv) % 2 != 1:
-        print(f'Use: {sys.argv[0]} host port [host port] ...')
-        sys.exit(1)
-
-    addr, ports = sys.argv[1::2], sys.argv[2::2]
-     
-    for addr, port in zip(addr, ports):
-        newthread = Client(addr, port)
-        newthread.start()
-    
-    print('Waiting for threads to finish')
-    for t in threading.enumerate():
-        if t is not threading.current_thread():
-            t.join()
-    print('All threads finished')
-    if len(return_value) > 0:
-        print(f'Result: {sum(return_value)/len(return_value)}')
+    args = argument_parser()
+    clients = [Client(addr, port, args.timeout) for addr, port in zip(args.servers[0::2], args.servers[1::2])]
+
+    results = []
+    executor = ThreadPoolExecutor(max_workers=len(clients))
+    futures = {executor.submit(client.query): client for client in clients}
+    print(f'Waiting for {args.first} of {len(clients)} servers')
+    try:
+        for future in as_completed(futures, timeout=args.deadline):
+            client = futures[future]
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f'{client} failed: {e}')
+                continue
+            print(f'Partial result: {sum(results)/len(results)} ({len(results)}/{len(clients)})')
+            if len(results) >= args.first:
+                break
+    except TimeoutError:
+        print(f'Deadline of {args.deadline}s reached')
+
+    for future, client in futures.items():
+        future.cancel() # the ones not started yet never run
+        client.cancel()
+    executor.shutdown(wait=False)
+
+    if len(results) >= args.first:
+        print(f'Result: {sum(results)/len(results)}')
+    elif len(results) > 0:
+        print(f'Result (only {len(results)} of {args.first} servers answered): {sum(results)/len(results)}')
     else:
         print('No results')
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
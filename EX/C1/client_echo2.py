@@ -15,7 +15,7 @@ if s is None:
 
 for line in sys.stdin:
     s.send(line.encode())
-    data=s.recv(4096).decode()
+    data=s.recv(jsockets.BUFSIZE).decode()
     print(data, end = '')
 
 s.close()
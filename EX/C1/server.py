@@ -1,27 +1,131 @@
 #!/usr/bin/python3
 import jsockets
 import sys
-import time, random
+import time, random, argparse, threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+
+MAX_DELAY = 3.0
+cache = None
 
 def calc():
-    # demoro un tiempo entre 0 y 3 s
-    time.sleep(random.random()*3.0)
+    # demoro un tiempo entre 0 y MAX_DELAY s
+    time.sleep(random.random()*MAX_DELAY)
     return 20
 
-# main
-if len(sys.argv) != 2:
-    print('Use: '+sys.argv[0]+' port')
-    sys.exit(1)
+class CalcCache:
+    """
+    Memoization for calc() with TTL and LRU eviction
+    Requests that arrive while a value is being computed wait for that same computation
+    """
+
+    def __init__(self, fn, ttl: float, size: int):
+        self.fn = fn
+        self.ttl = ttl
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._values = OrderedDict() # args -> (expires, value), least recently used first
+        self._inflight = {}          # args -> Future of the computation in progress
+        self._lock = threading.Lock()
+
+    def __str__(self) -> str:
+        return f'cache: {self.hits} hits, {self.misses} misses, {self.coalesced} coalesced'
+
+    def get(self, *args):
+        with self._lock:
+            entry = self._values.get(args)
+            if entry is not None and entry[0] > time.monotonic():
+                self._values.move_to_end(args)
+                self.hits += 1
+                return entry[1]
+            future = self._inflight.get(args)
+            owner = future is None
+            if owner:
+                future = self._inflight[args] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not owner:
+            return future.result()
+
+        try:
+            value = self.fn(*args)
+        except Exception as e:
+            with self._lock:
+                del self._inflight[args]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._values[args] = (time.monotonic() + self.ttl, value)
+            self._values.move_to_end(args)
+            while len(self._values) > self.size:
+                self._values.popitem(last=False)
+            del self._inflight[args]
+        future.set_result(value)
+        return value
 
-s = jsockets.socket_tcp_bind(int(sys.argv[1]))
+def handle(conn, addr):
+    try:
+        result = cache.get() if cache is not None else calc()
+        conn.send(str(result).encode('UTF-8'))
+        if cache is not None:
+            print(addr, 'result sent', f'({cache})')
+        else:
+            print(addr, 'result sent')
+    except OSError as e:
+        print(addr, f'could not send result: {e}')
+    finally:
+        conn.close()
+
+def serve_serial(s):
+    while True:
+        conn, addr = s.accept()
+        print('Connected by', addr)
+        handle(conn, addr)
+
+def serve_concurrent(s, workers):
+    # a lo más workers clientes a la vez; los demás esperan en la cola del listen
+    executor = ThreadPoolExecutor(max_workers=workers)
+    slots = threading.BoundedSemaphore(workers)
+    while True:
+        slots.acquire()
+        conn, addr = s.accept()
+        print('Connected by', addr)
+        future = executor.submit(handle, conn, addr)
+        future.add_done_callback(lambda f: slots.release())
+
+def argument_parser() -> argparse.Namespace:
+    global MAX_DELAY
+    parser = argparse.ArgumentParser(description='calc() server')
+    parser.add_argument('port', type=int, help='Port to listen on')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Clients served concurrently (1: serial)')
+    parser.add_argument('--max-delay', type=float, default=MAX_DELAY, help='Maximum calc() delay, in seconds')
+    parser.add_argument('--backlog', type=int, default=128, help='Listen queue length')
+    parser.add_argument('--cache-ttl', type=float, default=0, help='Cache calc() results for this many seconds (0: no cache)')
+    parser.add_argument('--cache-size', type=int, default=128, help='Maximum cached results')
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error('workers must be greater than 0')
+    if args.max_delay < 0:
+        parser.error('max-delay must not be negative')
+    if args.cache_ttl < 0 or args.cache_size < 1:
+        parser.error('cache-ttl must not be negative and cache-size must be greater than 0')
+    MAX_DELAY = args.max_delay
+    return args
+
+# main
+args = argument_parser()
+if args.cache_ttl > 0:
+    cache = CalcCache(calc, args.cache_ttl, args.cache_size)
+s = jsockets.socket_tcp_bind(args.port, backlog=args.backlog)
 
 if s is None:
-    print(f'could not open socket {sys.argv[1]}')
-    sys.exit(1) 
-    
-while True:
-    conn, addr = s.accept()
-    print('Connected by', addr)
-    conn.send(str(calc()).encode('UTF-8'))
-    print(addr, 'result sent')
-    conn.close()
\ No newline at end of file
+    print(f'could not open socket {args.port}')
+    sys.exit(1)
+
+if args.workers == 1:
+    serve_serial(s)
+else:
+    serve_concurrent(s, args.workers)
@@ -14,13 +14,14 @@ class ClientThread(threading.Thread):
 
     def run(self):
         print('Cliente Conectado')
+        rd = jsockets.Reader(self.sock, adaptive=True)
         while True:
-            data = self.sock.recv(1024)
+            data = rd.recv()
             if not data: break
             print('serv read')
-            self.sock.send(data)
+            self.sock.sendall(data)
             print('serv write')
-            self.sock.close()
+        self.sock.close()
         print('Cliente desconectado')
 
 s = jsockets.socket_tcp_bind(1818)
@@ -5,14 +5,17 @@
 """
 
 import socket, jsockets
-import sys, random, logging, time
+import sys, random, logging, time, argparse
 from abc import ABC, abstractmethod
+from jsockets.profiling import profiled, PhaseTimer
  
 """
     CONSTANTS
 """
 
 N_TRIES_STABLISH_PROTOCOL = 100
+ZERO_RTT_TRIES = 10     # Q handshake: tries, each one waiting twice as long as the previous
+MAX_BACKOFF = 3.0       # Q handshake: longest wait for an answer, in seconds
  
 """
     REQUIRED CODE TO BE USED
@@ -105,21 +108,42 @@ class UdpToyConnection(UdpConnectionInterface):
     
     def recive(self, size: int) -> bytes:
         recived = recv_loss(self._socket, size, self._loss_rate)
-        log_msg = f"{str(recived):.20} (... {len(recived)} ...)\'" if len(recived) > 20 else recived
-        logging.debug(f'{self} << {log_msg}')
+        if recived is not None:
+            log_msg = f"{str(recived):.20} (... {len(recived)} ...)\'" if len(recived) > 20 else recived
+            logging.debug(f'{self} << {log_msg}')
         return recived
 
+    def settimeout(self, timeout: float) -> None:
+        self._socket.settimeout(timeout)
+
+    def close(self) -> None:
+        self._socket.close()
+
+def get_flags() -> argparse.Namespace:
+    # optional flags (--profile file [--profile-mode cprofile|sample] [--profile-interval ms], --trace-phases, --zero-rtt),
+    # taken out of sys.argv so get_args still gets exactly the 7 positional arguments
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--profile', type=str, default=None)
+    parser.add_argument('--profile-mode', choices=['cprofile', 'sample'], default='cprofile')
+    parser.add_argument('--profile-interval', type=float, default=1.0)
+    parser.add_argument('--trace-phases', action='store_true')
+    parser.add_argument('--zero-rtt', action='store_true')
+    flags, sys.argv[1:] = parser.parse_known_args()
+    return flags
+
 def get_args() -> tuple:
     logging.debug(f'sys.argv = {sys.argv}')
+    usage = (f'Use: {sys.argv[0]} pack_sz nbytes timeout loss fileout host port [--zero-rtt] [--trace-phases] '
+             '[--profile file [--profile-mode cprofile|sample] [--profile-interval ms]]')
     
     if len(sys.argv) != 8:
-        logging.error(f'Use: {sys.argv[0]} pack_sz nbytes timeout loss fileout host port')
+        logging.error(usage)
         sys.exit(1)
         
     package_size, n_bytes, timeout, loss_rate, file_out, host, port = sys.argv[1:]
     
     if any(not x.isdigit() for x in [package_size, n_bytes, timeout, loss_rate, port]):
-        logging.error(f'Use: {sys.argv[0]} pack_sz nbytes timeout loss fileout host port')
+        logging.error(usage)
         sys.exit(1)
         
     package_size, n_bytes, timeout, loss_rate, port = map(int, [package_size, n_bytes, timeout, loss_rate, port])
@@ -127,7 +151,7 @@ def get_args() -> tuple:
     
     return package_size, n_bytes, timeout, loss_rate, file_out, host, port
 
-def stablish_protocol(udp_connection: UdpConnectionInterface, n_bytes: int, sv_timeout_ms: int, proposed_package_size: int) -> int:
+def stablish_protocol(udp_connection: UdpConnectionInterface, n_bytes: int, sv_timeout_ms: int, proposed_package_size: int) -> tuple:
     """_summary_
 
     Args:
@@ -140,7 +164,7 @@ def stablish_protocol(udp_connection: UdpConnectionInterface, n_bytes: int, sv_t
         Exception: _description_
 
     Returns:
-        int: _description_
+        tuple: package size and the first data frame, which belongs to the transfer
     """
     logging.debug(f'Init stablisish protocol')
     for i in range(N_TRIES_STABLISH_PROTOCOL):
@@ -151,13 +175,12 @@ def stablish_protocol(udp_connection: UdpConnectionInterface, n_bytes: int, sv_t
             package_size = int(in_msg[1:5])
             logging.info(f'recibo paquete: {package_size}')
             udp_connection.send(f"N{n_bytes}".encode())
-            in_msg  = udp_connection.recive(package_size)
-            in_msg  = in_msg.decode()
-            if in_msg[0] != 'D': 
-                raise Exception(f'Invalid data message, expected data got {in_msg[0]}')
+            first = udp_connection.recive(package_size)
+            if first[:1] not in (b'D', b'E'): 
+                raise Exception(f'Invalid data message, expected data got {first[:1].decode()}')
             logging.info(f'Protocol stablisished, data is being received')
             logging.info(f'recibiendo {n_bytes} nbytes')
-            return package_size
+            return package_size, first
             
         except Exception as e:
             logging.error(f'Error in stablisish protocol: {e}')
@@ -165,7 +188,38 @@ def stablish_protocol(udp_connection: UdpConnectionInterface, n_bytes: int, sv_t
     logging.critical(f'Could not stablish protocol after {N_TRIES_STABLISH_PROTOCOL} tries')
     sys.exit(1)
 
-def bandwith_stop_and_wait(udp_connection: UdpConnectionInterface, package_size: int, file_out: str) -> None:
+def stablish_zero_rtt(udp_connection: UdpConnectionInterface, n_bytes: int, sv_timeout_ms: int, proposed_package_size: int,
+                      recv_timeout: float) -> tuple:
+    """
+    0-RTT handshake: one Q{pack}{timeout}{nbytes} message, the server answers C and starts sending without
+    waiting for N. Unanswered Qs are resent with exponential backoff, starting at the server timeout
+
+    Returns:
+        tuple: same as stablish_protocol (the first data frame is None if the C reply came first)
+    """
+    logging.debug(f'Init 0-RTT protocol')
+    request = f"Q{proposed_package_size:04d}{sv_timeout_ms:04d}{n_bytes}".encode()
+    try:
+        for i in range(ZERO_RTT_TRIES):
+            udp_connection.settimeout(min(sv_timeout_ms/1000 * 2**i, MAX_BACKOFF))
+            udp_connection.send(request)
+            in_msg = udp_connection.recive(max(proposed_package_size, 8))
+            if not in_msg:
+                logging.error(f'No answer, retrying... ({i+1})')
+                continue
+            if in_msg[:1] in (b'D', b'E'): # the C reply was lost
+                logging.info(f'Protocol stablisished (0-RTT), data is being received')
+                return proposed_package_size, in_msg
+            if in_msg[:1] == b'C':
+                logging.info(f'Protocol stablisished (0-RTT), recibo paquete: {int(in_msg[1:5])}')
+                return int(in_msg[1:5]), None
+            logging.error(f'Invalid connection message, expected C got {in_msg[:1].decode()}')
+    finally:
+        udp_connection.settimeout(recv_timeout)
+    logging.critical(f'Could not stablish protocol after {ZERO_RTT_TRIES} tries')
+    sys.exit(1)
+
+def bandwith_stop_and_wait(udp_connection: UdpConnectionInterface, package_size: int, file_out: str, first: bytes = None) -> None:
     logging.info(f'Init bandwith stop and wait stress test')
     start_time = time.time()
     fdout = open(file_out, 'w')
@@ -173,7 +227,10 @@ def bandwith_stop_and_wait(udp_connection: UdpConnectionInterface, package_size:
     errors = 0
     try:
         while True:
-            in_msg = udp_connection.recive(package_size).decode()
+            if first is not None: # read by the handshake
+                in_msg, first = first.decode(), None
+            else:
+                in_msg = udp_connection.recive(package_size).decode()
             if in_msg[0] == "E":
                 n_package = int(in_msg[1:3])
                 udp_connection.send(f"A{n_package:02d}".encode())
@@ -203,11 +260,21 @@ bw = {(fdout.tell()) / (time_elapsed) / (1024*1024)} MB/s, \
 errores = {errors}')
 
 def main() -> None:
+    flags = get_flags()
     package_size, n_bytes, sv_timeout_ms, loss_rate, file_out, host, port = get_args()
+    phase = PhaseTimer(flags.trace_phases)
     
-    connection = UdpToyConnection(host, port, loss_rate, 3)
-    package_size = stablish_protocol(connection, n_bytes, sv_timeout_ms, package_size)
-    bandwith_stop_and_wait(connection, package_size, file_out)
+    with phase('handshake'):
+        connection = UdpToyConnection(host, port, loss_rate, 3)
+        if flags.zero_rtt:
+            package_size, first = stablish_zero_rtt(connection, n_bytes, sv_timeout_ms, package_size, 3)
+        else:
+            package_size, first = stablish_protocol(connection, n_bytes, sv_timeout_ms, package_size)
+    with phase('transfer'):
+        profiled(flags, bandwith_stop_and_wait, connection, package_size, file_out, first)
+    with phase('teardown'):
+        connection.close()
+    phase.report()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,158 @@
+#!/usr/bin/python3
+import argparse
+import importlib
+import contextlib
+import logging
+import math
+import io
+import os
+import sys
+import time
+
+# the client is not importable by its name (bwc-sr)
+bwc = importlib.import_module('bwc-sr')
+logger = bwc.logger
+
+def read_manifest(manifest):
+    """
+    Transfers to run, one per line: nbytes [fileout]. Empty lines and # comments are skipped.
+    Lines are read as they come, so the manifest can be a pipe fed by another program
+
+    Yields:
+        tuple: (nbytes, fileout)
+    """
+    for line in manifest:
+        fields = line.split('#', 1)[0].split()
+        if not fields:
+            continue
+        if not fields[0].isdigit() or int(fields[0]) < 1 or len(fields) > 2:
+            logger.error(f'bad manifest line, expected "nbytes [fileout]": {line.strip()}')
+            continue
+        yield int(fields[0]), fields[1] if len(fields) > 1 else os.devnull
+
+class BatchClient:
+    """
+    Long lived bwc-sr.py client: every transfer reuses one session (KEEP_OPTION) with the server,
+    skipping the socket, the handshake and the interpreter start up. A lost session (server restarted
+    or idle for too long) is opened again, and a server without sessions gets one connection per transfer
+    """
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.pack_sz = args.pack_sz + 3
+        self.options = (bwc.SACK_OPTION if args.sack else '') + (f'{bwc.FEC_OPTION}{args.fec:02d}' if args.fec else '') + bwc.KEEP_OPTION
+        self.udp_connection = None
+        self.sessions = 0
+
+    def _open(self, n_bytes: int) -> bytes:
+        args = self.args
+        self.udp_connection = bwc.UdpToyConnection(args.host, args.port, args.loss, args.timeout)
+        self.package_size, accepted, first = bwc.stablish_protocol(self.udp_connection, n_bytes, args.timeout, self.pack_sz,
+                                                                   self.options, zero_rtt=args.zero_rtt)
+        self.accepted = bwc.parse_options(accepted)
+        self.offset = 0
+        self.sessions += 1
+        if bwc.KEEP_OPTION not in self.accepted and self.sessions == 1:
+            logger.warning('the server does not keep sessions: one connection per transfer')
+        return first
+
+    def transfer(self, n_bytes: int, fileout: str) -> dict:
+        """
+        Returns:
+            dict: bandwith_selective_repeat report plus wall (seconds, handshake or request included)
+                and handshake (a new session was opened), None if the transfer failed
+        """
+        n_bytes += 3*math.ceil(n_bytes/self.args.pack_sz) # as bwc-sr.py counts them, headers included
+        start = time.perf_counter()
+        handshake = self.udp_connection is None
+        try:
+            if handshake:
+                first = self._open(n_bytes)
+            else:
+                try:
+                    first = bwc.request_transfer(self.udp_connection, n_bytes, self.package_size, self.offset)
+                except Exception as e:
+                    logger.warning(f'session lost ({e}), opening a new one')
+                    self.close(end=False)
+                    handshake = True
+                    first = self._open(n_bytes)
+            with contextlib.redirect_stdout(io.StringIO()): # the report line, we print our own
+                result = bwc.bandwith_selective_repeat(self.udp_connection, self.package_size, fileout,
+                                                       bwc.SACK_OPTION in self.accepted, self.accepted.get(bwc.FEC_OPTION, 0),
+                                                       first, self.offset)
+        except Exception as e:
+            logger.error(f'transfer of {n_bytes} bytes failed: {e}')
+            result = None
+        if result is None or bwc.KEEP_OPTION not in self.accepted:
+            self.close(end=False)
+        if result is None:
+            return None
+        self.offset = result['next']
+        result['wall'] = time.perf_counter() - start
+        result['handshake'] = handshake
+        return result
+
+    def close(self, end: bool = True) -> None:
+        if self.udp_connection is not None:
+            if end:
+                bwc.end_session(self.udp_connection)
+            self.udp_connection.close()
+            self.udp_connection = None
+
+def argument_parser() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Runs the transfers of a manifest (one "nbytes [fileout]" per line) '
+                                                 'over one bwc-sr.py session, printing a CSV line per transfer')
+    parser.add_argument('manifest', type=str, help='Manifest file, - reads it from stdin as lines arrive')
+    parser.add_argument('pack_sz', type=int, help='Package size')
+    parser.add_argument('timeout', type=int, help='Timeout')
+    parser.add_argument('loss', type=int, help='Loss rate to be simulated')
+    parser.add_argument('host', type=str, help='Host to be connected')
+    parser.add_argument('port', type=int, help='Port to connect')
+    parser.add_argument('--window_sz', type=int, help='Window size', default=bwc.WINDOW_SIZE)
+    parser.add_argument('--sack', action='store_true', help='Propose block (bitmap) acknowledgements to the server')
+    parser.add_argument('--fec', type=int, metavar='K', help='Propose one XOR parity frame every K data frames', default=0)
+    parser.add_argument('--zero-rtt', action='store_true', help='Single message (Q) handshake when a session is opened')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Log every transfer as bwc-sr.py does')
+    args = parser.parse_args()
+    if args.pack_sz < 1 or args.timeout < 1:
+        parser.error('Package size and timeout must be greater than 0')
+    if args.pack_sz > bwc.MAX_PACKAGE_SIZE - 3:
+        parser.error(f'Package size must be at most {bwc.MAX_PACKAGE_SIZE - 3}')
+    if not 0 <= args.loss < 100:
+        parser.error('Loss rate must be between 0 and 99')
+    if not 1 <= args.window_sz <= bwc.MAX_FRAME//2:
+        parser.error(f'Window size must be between 1 and {bwc.MAX_FRAME//2}')
+    if args.fec and not 2 <= args.fec <= args.window_sz:
+        parser.error(f'FEC block must be between 2 and {args.window_sz}')
+    bwc.WINDOW_SIZE = args.window_sz
+    return args
+
+def main():
+    args = argument_parser()
+    if not args.verbose:
+        bwc.ch.setLevel(logging.WARNING)
+    client = BatchClient(args)
+    manifest = sys.stdin if args.manifest == '-' else open(args.manifest)
+    print('transfer, nbytes, bandwith, bytes, time, errors, wall_ms, handshake', flush=True)
+    start = time.perf_counter()
+    done = failed = 0
+    try:
+        for i, (n_bytes, fileout) in enumerate(read_manifest(manifest)):
+            result = client.transfer(n_bytes, fileout)
+            if result is None:
+                failed += 1
+                print(f'{i}, {n_bytes}, 0, 0, 0, 0, 0, 0', flush=True)
+                continue
+            done += 1
+            print(f'{i}, {n_bytes}, {result["bandwith"]:.3g}, {result["bytes"]}, {result["time"]:.3g}, {result["errors"]}, '
+                  f'{1000*result["wall"]:.3f}, {int(result["handshake"])}', flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.close()
+        if manifest is not sys.stdin:
+            manifest.close()
+    elapsed = time.perf_counter() - start
+    print(f'{done} transfers ({failed} failed) in {elapsed:.3f}s, {client.sessions} sessions', file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/python3
+import argparse
+import importlib
+import contextlib
+import cProfile
+import pstats
+import logging
+import io
+import os
+import time
+
+# the client is not importable by its name (bwc-sr)
+bwc = importlib.import_module('bwc-sr')
+logger = bwc.logger
+
+def replay_once(udp_connection, fileout: str) -> float:
+    """
+    Plays the whole trace through the client: handshake, then the timed receive path
+
+    Returns:
+        float: seconds spent in bandwith_selective_repeat
+    """
+    meta = udp_connection.meta
+    udp_connection.rewind()
+    package_size, accepted, first = bwc.stablish_protocol(udp_connection, meta['nbytes'], meta['timeout'], meta['pack_sz'],
+                                                          meta['options'], zero_rtt=meta.get('zero_rtt', False))
+    accepted = bwc.parse_options(accepted)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()): # the report line of every run
+        bwc.bandwith_selective_repeat(udp_connection, package_size, fileout, sack=bwc.SACK_OPTION in accepted,
+                                      fec_k=accepted.get(bwc.FEC_OPTION, 0), first=first)
+    return time.perf_counter() - start
+
+def argument_parser() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Receive path microbenchmark: replays a trace recorded with bwc-sr.py --record')
+    parser.add_argument('trace', type=str, help='Trace file')
+    parser.add_argument('-n', '--runs', type=int, help='Number of runs', default=10)
+    parser.add_argument('--pace', action='store_true', help='Replay at the recorded pace')
+    parser.add_argument('--fileout', type=str, help='Where the received data is written (default: /dev/null)', default=os.devnull)
+    parser.add_argument('--profile', type=str, help='Profile one more run with cProfile and dump the stats to this file', default=None)
+    args = parser.parse_args()
+    if args.runs < 1:
+        parser.error('Number of runs must be greater than 0')
+    return args
+
+def main():
+    args = argument_parser()
+    bwc.ch.setLevel(logging.WARNING)
+    udp_connection = bwc.UdpReplayConnection(args.trace, args.pace)
+    if udp_connection.meta.get('upload'):
+        logger.critical('upload traces only have acknowledgements, record a download')
+        return
+    records = udp_connection._records
+    frames = sum(1 for t, d in records if d is not None and d[:1] in (b'D', b'E', b'P'))
+    payload = sum(len(d) - 3 for t, d in records if d is not None and d[:1] in (b'D', b'E'))
+    print(f'{args.trace}: {len(records)} records, {frames} frames, {payload} bytes, options "{udp_connection.meta["options"]}"')
+
+    times = sorted(replay_once(udp_connection, args.fileout) for i in range(args.runs))
+    best, median = times[0], times[len(times)//2]
+    print(f'best {1000*best:.3f} ms, median {1000*median:.3f} ms over {args.runs} runs')
+    print(f'{frames/best:.0f} frames/s, {payload/best/1024/1024:.1f} MBytes/s, {udp_connection.sent} acks per run')
+
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        replay_once(udp_connection, args.fileout)
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+        pstats.Stats(args.profile).sort_stats('cumulative').print_stats(15)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+#!/usr/bin/python3
+import argparse
+import importlib
+import os
+import threading
+import time
+import socket
+import random
+import select
+import jsockets
+
+# the client is not importable by its name (bwc-sr), reuse its protocol helpers and logger
+bwc = importlib.import_module('bwc-sr')
+logger = bwc.logger
+
+SESSION_IDLE = 30.0         # seconds a session (KEEP_OPTION) waits for the next N before closing
+
+class UdpServerConnection(bwc.UdpConnectionInterface):
+    """
+    Connected UDP socket for one client, on the server side.
+    Unlike UdpToyConnection a timeout is not an error here, recive just returns None
+    """
+    def __init__(self, sock: socket.socket, addr: tuple, loss_rate: float = 0.0):
+        self._socket    = sock
+        self._addr      = addr
+        self._loss_rate = loss_rate
+        self._socket.connect(addr)
+
+    def __str__(self) -> str:
+        return f'UDPSC [{self._addr[0]}:{self._addr[1]}]'
+
+    def settimeout(self, timeout: float) -> None:
+        self._socket.settimeout(max(timeout, 0.0001))
+
+    def send(self, data: bytes) -> None:
+        bwc._send_loss(self._socket, data, self._loss_rate)
+
+    def recive(self, size: int) -> bytes:
+        while True:
+            try:
+                data = self._socket.recv(size)
+            except socket.timeout:
+                return None
+            if random.random() * 100 > self._loss_rate:
+                return data
+            logger.warning("[recv_loss]")
+
+    def pending(self) -> bool:
+        return bool(select.select([self._socket], [], [], 0)[0])
+
+    def close(self) -> None:
+        self._socket.close()
+
+class Session(threading.Thread):
+    """
+    One client: negotiates package size, timeout and extensions, then sends the N bytes it asks for
+    or receives the U bytes it uploads. A Q message negotiates and asks for N bytes at once.
+    With KEEP_OPTION the connection stays open after a download and every new N starts another one,
+    numbered after the last frame of the previous, until X or SESSION_IDLE seconds without requests
+    """
+    def __init__(self, udp_connection: UdpServerConnection, first_msg: str, args: argparse.Namespace):
+        threading.Thread.__init__(self, daemon=True)
+        self.udp_connection = udp_connection
+        self.first_msg = first_msg
+        self.window_size = args.window_sz
+        self.cc = args.cc
+        self.trace = args.trace
+
+    def handshake(self) -> tuple:
+        msg = self.first_msg
+        package_size = min(int(msg[1:5]), bwc.MAX_PACKAGE_SIZE)
+        timeout_ms = int(msg[5:9])
+        rest = msg[9:]
+        if msg[0] == 'Q': # 0-RTT: the byte count comes before the extensions
+            digits = len(rest) - len(rest.lstrip('0123456789'))
+            n_bytes, rest = int(rest[:digits]), rest[digits:]
+        options = bwc.parse_options(rest)
+        accepted = bwc.SACK_OPTION if options.get(bwc.SACK_OPTION) else ''
+        if 2 <= options.get(bwc.FEC_OPTION, 0) <= self.window_size:
+            accepted += f'{bwc.FEC_OPTION}{options[bwc.FEC_OPTION]:02d}'
+        if options.get(bwc.KEEP_OPTION):
+            accepted += bwc.KEEP_OPTION
+        reply = f'C{package_size:04d}{timeout_ms:04d}{accepted}'.encode()
+        self.udp_connection.settimeout(timeout_ms/1000)
+        if msg[0] == 'Q' and bwc.parse_options(accepted) == options:
+            # everything accepted: start right away, data before the C tells the client so if the C is lost
+            self.udp_connection.send(reply)
+            return 'N', package_size, timeout_ms/1000, accepted, n_bytes, None
+        for i in range(bwc.IDLE_TRIES):
+            self.udp_connection.send(reply)
+            msg = self.udp_connection.recive(64)
+            if msg is None or msg[:1] in (b'C', b'Q'):
+                continue # lost reply or the client retried: answer again
+            if msg[:1] in (b'N', b'U'):
+                return msg[:1].decode(), package_size, timeout_ms/1000, accepted, int(msg[1:]), None
+            if msg[:1] in (b'D', b'E', b'P'):
+                # U was lost, the upload already started: keep its first frame, as the client does for downloads
+                return 'U', package_size, timeout_ms/1000, accepted, 0, msg
+            raise ValueError(f'expected N or U, got {msg[:10]}')
+        raise TimeoutError(f'no N or U after {bwc.IDLE_TRIES} tries')
+
+    def receive(self, package_size: int, timeout: float, options: dict, first: bytes = None) -> None:
+        conn = self.udp_connection
+        conn.settimeout(bwc.IDLE_TRIES * timeout)
+        bwc.bandwith_selective_repeat(conn, package_size, os.devnull, options.get(bwc.SACK_OPTION, False),
+                                      options.get(bwc.FEC_OPTION, 0), first)
+        # if the last acknowledgement is lost the client resends E: acknowledge it again for a while
+        conn.settimeout(3 * timeout)
+        while True:
+            msg = conn.recive(package_size + bwc.FEC_HEADER)
+            if msg is None:
+                break
+            if msg[:1] in (b'D', b'E'):
+                conn.send(b'A' + msg[1:3])
+
+    def next_request(self, offset: int) -> int:
+        """
+        Session: waits for the next N<bytes>:<offset>, skipping late acknowledgements of the last
+        transfer and resent requests of it (their offset is not the next one). A bare N<bytes> is the
+        handshake request resent, never a new transfer
+
+        Returns:
+            int: bytes asked for, None when the client ends the session or goes quiet
+        """
+        self.udp_connection.settimeout(SESSION_IDLE)
+        while True:
+            msg = self.udp_connection.recive(64)
+            if msg is None or msg[:1] == bwc.END_SESSION:
+                return None
+            if msg[:1] == b'N':
+                n_bytes, _, nn = msg[1:].partition(b':')
+                if nn and int(nn) == offset:
+                    return int(n_bytes)
+
+    def run(self):
+        conn = self.udp_connection
+        try:
+            mode, package_size, timeout, accepted, n_bytes, first = self.handshake()
+            logger.info(f'{conn}: {mode} {n_bytes} bytes, package {package_size}, timeout {timeout:.3f}s, extensions "{accepted}"')
+            start = time.time()
+            options = bwc.parse_options(accepted)
+            if mode == 'U':
+                self.receive(package_size, timeout, options, first)
+                logger.info(f'{conn}: upload done in {time.time()-start:.3f}s')
+                return
+            offset = 0
+            while n_bytes is not None:
+                frames = bwc.make_frames(n_bytes, package_size, offset)
+                sender = bwc.SelectiveRepeatSender(conn, frames, timeout, self.window_size,
+                                                   options.get(bwc.FEC_OPTION, 0), cc=self.cc, offset=offset)
+                stats = sender.run()
+                logger.info(f'{conn}: done in {time.time()-start:.3f}s {stats}')
+                if self.cc and self.trace:
+                    sender.write_trace(f'{self.trace}{conn._addr[1]}.csv')
+                if not options.get(bwc.KEEP_OPTION):
+                    break
+                offset = (offset + len(frames)) % bwc.MAX_FRAME
+                n_bytes = self.next_request(offset)
+                start = time.time()
+                if n_bytes is not None:
+                    logger.info(f'{conn}: N {n_bytes} bytes (same session)')
+        except (OSError, ValueError) as e:
+            logger.warning(f'{conn}: session ended: {e}')
+        finally:
+            conn.close()
+
+def argument_parser() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Reference bandwith server for bwc-sr.py')
+    parser.add_argument('port', type=int, nargs='?', default=1818, help='Port to listen on')
+    parser.add_argument('--window_sz', type=int, help='Window size', default=bwc.WINDOW_SIZE)
+    parser.add_argument('--loss', type=float, help='Loss rate to be simulated', default=0.0)
+    parser.add_argument('--cc', action='store_true', help='Download with AIMD congestion control, paced at cwnd/srtt')
+    parser.add_argument('--trace', type=str, help='With --cc, write the cwnd/ssthresh trace of each client to <TRACE><client port>.csv', default=None)
+    args = parser.parse_args()
+    if not 1 <= args.window_sz <= bwc.MAX_FRAME//2:
+        parser.error(f'Window size must be between 1 and {bwc.MAX_FRAME//2}')
+    if not 0 <= args.loss < 100:
+        parser.error('Loss rate must be between 0 and 99')
+    bwc.WINDOW_SIZE = args.window_sz # also the receiver window for uploads
+    return args
+
+def main():
+    args = argument_parser()
+    s = jsockets.socket_udp_bind(args.port)
+    if s is None:
+        logger.critical('could not open socket')
+        return
+    logger.info(f'Listening on port {args.port}')
+    sessions = {}
+    while True:
+        data, addr = s.recvfrom(jsockets.BUFSIZE)
+        if data[:1] not in (b'C', b'Q') or (addr in sessions and sessions[addr].is_alive()):
+            continue
+        try:
+            first_msg = data.decode()
+        except UnicodeDecodeError:
+            logger.warning(f'malformed request from {addr}: {data[:10]}')
+            continue # before opening its socket, so there is nothing to close
+        # same REUSEPORT trick as S2/server_echo_udp2.py: a connected socket per client
+        conn = jsockets.socket_udp_bind(args.port)
+        if conn is None:
+            logger.error('could not open client socket')
+            continue
+        sessions = {a: t for a, t in sessions.items() if t.is_alive()}
+        sessions[addr] = Session(UdpServerConnection(conn, addr, args.loss), first_msg, args)
+        sessions[addr].start()
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,12 @@ import socket
 import random
 import sys
 import math
+import select
+import heapq
+import struct
+import json
 from abc import ABC, abstractmethod
+from jsockets.profiling import profiled, PhaseTimer
 
 class CustomFormatter(logging.Formatter):
     green       = "\x1b[32;20m"
@@ -41,6 +46,24 @@ logger.addHandler(logging.FileHandler('output.log'))
 N_TRIES_STABLISH_PROTOCOL = 2
 WINDOW_SIZE = 50
 MAX_FRAME = 100
+SACK_OPTION = 'S'       # negotiated in the C message: block ACKs (B<cum><bitmap>) instead of A/a
+ACK_BATCH = 16          # max frames covered by a single SACK when more datagrams are queued
+FEC_OPTION = 'F'        # F<kk>: one XOR parity frame P<first><count><xorlen, 4 hex digits> after every kk data frames
+FEC_HEADER = 9
+MAX_PACKAGE_SIZE = 9999 # the C message only has 4 digits for it, headers included
+KEEP_OPTION = 'K'       # negotiated in the C message: after a download the server waits for another N (session)
+IDLE_TRIES = 10         # sender: retransmission timeouts without any acknowledgement before giving up
+FAST_RETRANSMIT = 3     # sender: frames SACKed after a hole before it is resent without waiting its timer
+PATTERN = b'abcdefghijklmnopqrstuvwxyz0123456789\n'
+INITIAL_CWND = 4        # sender with congestion control: frames in flight at the start
+PACING_GAIN = 1.25      # pacing rate over cwnd/srtt, a bit above it so the pacer never limits the window
+PACING_BURST = 2        # frames the pacer lets out back to back
+TRACE_MAGIC = b'BWCT'   # datagram trace: magic, !H meta length, meta (json), then one record per recive
+TRACE_RECORD = struct.Struct('!dI')     # seconds since the connection was opened, length (TRACE_TIMEOUT: None)
+TRACE_TIMEOUT = 0xFFFFFFFF
+ZERO_RTT_TRIES = 8      # Q handshake: tries, each one waiting twice as long as the previous
+MAX_BACKOFF = 3.0       # Q handshake: longest wait for an answer, in seconds
+END_SESSION = b'X'
 
 class UdpConnectionInterface(ABC):
     """
@@ -55,6 +78,19 @@ class UdpConnectionInterface(ABC):
     def recive(self, size: int) -> bytes:
         pass
 
+    def pending(self) -> bool:
+        """
+        True if there are datagrams waiting to be received, used to batch acknowledgements
+        """
+        return False
+
+    @abstractmethod
+    def settimeout(self, timeout: float) -> None:
+        """
+        Changes how long recive waits before returning None, in seconds. Needed by the sender
+        """
+        pass
+
 def _send_loss(s, data, loss_rate):
     # Envia un paquete con loss_rate porcentaje de perdida
     # si loss_rate = 5, implica un 5% de perdida
@@ -75,7 +111,7 @@ def _recv_loss(s, size, loss_rate):
             else:
                 break
     except socket.timeout:
-        logger.error('[timeout]')
+        logger.debug('[timeout]')
         data = None
     except socket.error:
         logger.error('[recv err]')
@@ -83,7 +119,14 @@ def _recv_loss(s, size, loss_rate):
     return data
 
 class UdpToyConnection(UdpConnectionInterface):
-    def __init__(self, address: str, port: int, loss_rate: float = 0.0, timeout: float = 0.0):
+    def __init__(self, address: str, port: int, loss_rate: float = 0.0, timeout: float = 0.0,
+                 record: str = None, meta: dict = None):
+        """
+        Args:
+            record (str): if given, every recive result (after the simulated loss) is dumped to this
+                trace file with its timestamp, to be played back by UdpReplayConnection
+            meta (dict): stored in the trace header, ex: the arguments of the run
+        """
         self._address   = address
         self._port      = port
         self._loss_rate = loss_rate
@@ -94,6 +137,12 @@ class UdpToyConnection(UdpConnectionInterface):
             logger.error(f'Could not open UdpToyConnection')
             sys.exit(1)
         self._socket.settimeout(self._timeout)
+        self._record = None
+        if record:
+            meta = json.dumps(meta or {}).encode()
+            self._record = open(record, 'wb')
+            self._record.write(TRACE_MAGIC + struct.pack('!H', len(meta)) + meta)
+            self._start = time.monotonic()
     
     def __str__(self) -> str:
         return f'UDPTC [{self._address}:{self._port}]'
@@ -107,13 +156,206 @@ class UdpToyConnection(UdpConnectionInterface):
         if recived != None:
             log_msg = f"{str(recived):.20} (... +{len(recived)-20} ...)\'" if len(recived) > 20 else recived
             logger.debug(f'{self} -> {log_msg}')
+        if self._record:
+            length = TRACE_TIMEOUT if recived is None else len(recived)
+            self._record.write(TRACE_RECORD.pack(time.monotonic() - self._start, length) + (recived or b''))
         return recived
 
+    def pending(self) -> bool:
+        return bool(select.select([self._socket], [], [], 0)[0])
+
+    def settimeout(self, timeout: float) -> None:
+        self._timeout = timeout
+        self._socket.settimeout(timeout)
+
+    def close(self) -> None:
+        if self._record:
+            self._record.close()
+            self._record = None
+        self._socket.close()
+
+def read_trace(tracefile: str) -> tuple:
+    """
+    Loads a trace written by UdpToyConnection(record=...)
+
+    Returns:
+        tuple: (meta dict, list of (seconds, datagram or None))
+    """
+    with open(tracefile, 'rb') as f:
+        data = f.read()
+    if data[:4] != TRACE_MAGIC:
+        raise ValueError(f'{tracefile} is not a datagram trace')
+    meta_len, = struct.unpack_from('!H', data, 4)
+    meta = json.loads(data[6:6+meta_len])
+    records = []
+    pos = 6 + meta_len
+    while pos + TRACE_RECORD.size <= len(data):
+        t, length = TRACE_RECORD.unpack_from(data, pos)
+        pos += TRACE_RECORD.size
+        if length == TRACE_TIMEOUT:
+            records.append((t, None))
+        else:
+            records.append((t, data[pos:pos+length]))
+            pos += length
+    return meta, records
+
+class UdpReplayConnection(UdpConnectionInterface):
+    """
+    Plays back a recorded trace: recive returns the recorded datagrams (and timeouts) in order, sends
+    are only counted. Without network, loss or timers, the receive path runs deterministically.
+    When the trace ends recive returns None, like a timeout
+    
+    Args:
+        tracefile (str): file written by UdpToyConnection(record=...)
+        pace (bool): wait until the recorded time of each datagram instead of going as fast as possible
+    """
+    def __init__(self, tracefile: str, pace: bool = False):
+        self.meta, self._records = read_trace(tracefile)
+        self._tracefile = tracefile
+        self._pace = pace
+        self.rewind()
+
+    def __str__(self) -> str:
+        return f'UDPRC [{self._tracefile}]'
+
+    def rewind(self) -> None:
+        self._next = 0
+        self._start = time.monotonic()
+        self.sent = 0
+
+    def send(self, data: bytes) -> None:
+        self.sent += 1
+
+    def recive(self, size: int) -> bytes:
+        if self._next >= len(self._records):
+            return None
+        t, data = self._records[self._next]
+        self._next += 1
+        if self._pace:
+            wait = self._start + t - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+        return data if data is None else data[:size]
+
+    def pending(self) -> bool:
+        if self._next >= len(self._records) or self._records[self._next][1] is None:
+            return False
+        return not self._pace or self._start + self._records[self._next][0] <= time.monotonic()
+
+    def settimeout(self, timeout: float) -> None:
+        pass
+
+def sack_message(lfr: int, window: list) -> bytes:
+    """
+    Block acknowledgement: B, the cumulative frame (last in order) and a hex bitmap where
+    bit i says that frame lfr+i is already buffered in the window. Only the first MAX_FRAME slots
+    are sent, past them the numbers repeat, so the message always fits in the sender's 64 bytes
+    """
+    window = window[:MAX_FRAME]
+    bitmap = 0
+    for i, pckge in enumerate(window):
+        if pckge is not None:
+            bitmap |= 1 << i
+    return f"B{(lfr-1)%MAX_FRAME:02d}{bitmap:0{(len(window)+3)//4}x}".encode()
+
+def parse_sack(msg: str) -> tuple:
+    """
+    Inverse of sack_message
+
+    Returns:
+        tuple: (cumulative frame, list of offsets after it that were received)
+    """
+    cum = int(msg[1:3])
+    bitmap = int(msg[3:], 16) if len(msg) > 3 else 0
+    return cum, [i for i in range(bitmap.bit_length()) if bitmap >> i & 1]
+
+def parse_options(options: str) -> dict:
+    """
+    Parses the extensions of a C message, ex: 'SF04' -> {'S': True, 'F': 4}
+    """
+    opts = {}
+    i = 0
+    while i < len(options):
+        if options[i] == FEC_OPTION:
+            opts[FEC_OPTION] = int(options[i+1:i+3])
+            i += 3
+        else:
+            opts[options[i]] = True
+            i += 1
+    return opts
+
+def xor_frames(frames: list) -> tuple:
+    """
+    XOR of the frames, padded with zeros to the longest one
+
+    Returns:
+        tuple: (xor of the frames, xor of their lengths)
+    """
+    width = max(len(f) for f in frames)
+    x = 0
+    xorlen = 0
+    for f in frames:
+        x ^= int.from_bytes(f.ljust(width, b'\0'), 'big')
+        xorlen ^= len(f)
+    return x.to_bytes(width, 'big'), xorlen
+
+class FecDecoder:
+    """
+    Receiver side of the F option: keeps the frames seen and the parity of each block, and rebuilds
+    a frame when it is the only one of its block still missing
+    """
+    def __init__(self, k: int):
+        self.k = k
+        self.frames   = {}  # nn -> frame
+        self.parities = {}  # nn of the first frame of the block -> parity frame
+        self.recovered = 0
+
+    def forget(self, nn: int) -> None:
+        # called as the window moves, so frames of the previous lap of the numbers are never used
+        self.frames.pop(nn, None)
+        self.parities.pop(nn, None)
+
+    def add(self, pckge: str, lfr: int) -> list:
+        """
+        Registers a data or parity frame
+
+        Returns:
+            list: frames rebuilt thanks to it (at most one)
+        """
+        nn = int(pckge[1:3])
+        if pckge[0] == 'P':
+            self.parities[nn] = pckge
+            return self._rebuild(nn, lfr)
+        self.frames[nn] = pckge
+        for first in self.parities:
+            if (nn - first) % MAX_FRAME < self.k:
+                return self._rebuild(first, lfr)
+        return []
+
+    def _rebuild(self, first: int, lfr: int) -> list:
+        parity = self.parities[first]
+        block = [(first+i) % MAX_FRAME for i in range(int(parity[3:5]))]
+        missing = [nn for nn in block if nn not in self.frames]
+        if not missing:
+            del self.parities[first]
+        if len(missing) != 1 or (missing[0] - lfr) % MAX_FRAME >= WINDOW_SIZE:
+            return []
+        others = [self.frames[nn].encode() for nn in block if nn != missing[0]]
+        rebuilt, xorlen = xor_frames(others + [parity[FEC_HEADER:].encode()])
+        del self.parities[first]
+        self.recovered += 1
+        pckge = rebuilt[:int(parity[5:9], 16) ^ xorlen ^ (len(parity) - FEC_HEADER)].decode()
+        self.frames[missing[0]] = pckge
+        return [pckge]
+
 def stablish_protocol(udp_connection: UdpConnectionInterface, 
                       n_bytes: int, 
                       sv_timeout_ms: int, 
-                      proposed_package_size: int
-                      ) -> int:
+                      proposed_package_size: int,
+                      options: str = '',
+                      upload: bool = False,
+                      zero_rtt: bool = False
+                      ) -> tuple:
     """
     Stablish protocol with server
     
@@ -122,28 +364,41 @@ def stablish_protocol(udp_connection: UdpConnectionInterface,
         n_bytes (int): number of bytes to be received
         sv_timeout_ms (int): _description_
         proposed_package_size (int): _description_
+        options (str): protocol extensions to propose, appended to the C message
+        upload (bool): ask to send n_bytes (U) instead of receiving them (N)
+        zero_rtt (bool): a single Q message instead of C then N (downloads only)
 
     Returns:
-        int: Returns package size agreed by the server
+        tuple: package size agreed by the server, the extensions it accepted and the first data
+            frame already read (or None), which belongs to the transfer
     """
+    if zero_rtt and not upload:
+        return stablish_zero_rtt(udp_connection, n_bytes, sv_timeout_ms, proposed_package_size, options)
     logger.debug(f'Init stablisish protocol')
     for i in range(N_TRIES_STABLISH_PROTOCOL):
         try:
             logger.info(f'propouse paquete: {proposed_package_size}')
-            udp_connection.send(f"C{proposed_package_size:04d}{sv_timeout_ms:04d}".encode())
-            in_msg  = udp_connection.recive(8).decode()
+            udp_connection.send(f"C{proposed_package_size:04d}{sv_timeout_ms:04d}{options}".encode())
+            in_msg  = udp_connection.recive(64).decode()
             if in_msg[0] != 'C':
                 raise Exception(f'Invalid connection message, expected connection C, got {in_msg[0]}')
             package_size = int(in_msg[1:5])
+            accepted = in_msg[9:] if options else ''
             logger.info(f'recibo paquete: {package_size}')
+            if options:
+                logger.info(f'extensiones aceptadas: {accepted or "ninguna"}')
+            if upload:
+                # the server takes the first data frame as confirmation if U is lost
+                udp_connection.send(f"U{n_bytes}".encode())
+                logger.info(f'enviando {n_bytes} nbytes')
+                return package_size, accepted, None
             udp_connection.send(f"N{n_bytes}".encode())
-            in_msg  = udp_connection.recive(package_size)
-            in_msg  = in_msg.decode()
-            if not (in_msg[0] == 'D' or in_msg[0] == 'E'): 
-                raise Exception(f'Invalid data message, expected data D, got {in_msg[0]}')
+            first = udp_connection.recive(package_size + FEC_HEADER)
+            if first[:1] not in (b'D', b'E', b'P'):
+                raise Exception(f'Invalid data message, expected data D, got {first[:1].decode()}')
             logger.info(f'Protocol stablished, data is being received')
             logger.info(f'recibiendo {n_bytes} nbytes')
-            return package_size
+            return package_size, accepted, first
             
         except Exception as e:
             logger.error(f'Error in stablish protocol: {e}')
@@ -151,24 +406,118 @@ def stablish_protocol(udp_connection: UdpConnectionInterface,
     logger.critical(f'Could not stablish protocol after {N_TRIES_STABLISH_PROTOCOL} tries')
     raise Exception(f'Could not stablish protocol after {N_TRIES_STABLISH_PROTOCOL} tries')
 
-def bandwith_selective_repeat(udp_connection: UdpConnectionInterface, package_size: int, fileout: str) -> None:
-    logger.info(f'Init bandwith selective repeat')
+def stablish_zero_rtt(udp_connection: UdpConnectionInterface,
+                      n_bytes: int,
+                      sv_timeout_ms: int,
+                      proposed_package_size: int,
+                      options: str = ''
+                      ) -> tuple:
+    """
+    0-RTT handshake: Q{pack}{timeout}{nbytes}{options} asks for everything at once. A server that accepts
+    every extension answers C and starts sending right away, so a data frame before the C means it
+    did. One that declines some answers C and waits for N: the C/N handshake goes on with what it
+    accepted. Unanswered Qs are resent with exponential backoff
+
+    Returns:
+        tuple: same as stablish_protocol
+    """
+    request = f"Q{proposed_package_size:04d}{sv_timeout_ms:04d}{n_bytes}{options}".encode()
+    timeout = sv_timeout_ms/1000
+    try:
+        for i in range(ZERO_RTT_TRIES):
+            udp_connection.settimeout(min(timeout * 2**i, MAX_BACKOFF))
+            udp_connection.send(request)
+            in_msg = udp_connection.recive(proposed_package_size + FEC_HEADER)
+            if not in_msg:
+                logger.error(f'No answer to Q, retrying... ({i+1})')
+                continue
+            if in_msg[:1] in (b'D', b'E', b'P'): # the C reply was lost
+                logger.info(f'Protocol stablished (0-RTT), data is being received')
+                return proposed_package_size, options, in_msg
+            if in_msg[:1] != b'C':
+                logger.error(f'Invalid connection message, expected connection C, got {in_msg[:1].decode()}')
+                continue
+            package_size = int(in_msg[1:5])
+            accepted = in_msg[9:].decode() if options else ''
+            if parse_options(accepted) != parse_options(options):
+                logger.info(f'extensiones aceptadas: {accepted or "ninguna"}, sigue con C/N')
+                udp_connection.settimeout(timeout)
+                return stablish_protocol(udp_connection, n_bytes, sv_timeout_ms, package_size, accepted)
+            logger.info(f'Protocol stablished (0-RTT), data is being received')
+            return package_size, accepted, None
+    finally:
+        udp_connection.settimeout(timeout)
+    logger.critical(f'Could not stablish protocol after {ZERO_RTT_TRIES} tries')
+    raise Exception(f'Could not stablish protocol after {ZERO_RTT_TRIES} tries')
+
+def bandwith_selective_repeat(udp_connection: UdpConnectionInterface, package_size: int, fileout: str, sack: bool = False, fec_k: int = 0,
+                              first: bytes = None, offset: int = 0) -> dict:
+    """
+    Receives a download and prints the report line (bandwith, bytes, time, errors)
+
+    Args:
+        first (bytes): data frame already read by the handshake
+        offset (int): number of the first frame, in a session the one after the last transfer
+
+    Returns:
+        dict: the report, plus the frame number where the next transfer of a session starts (None on error)
+    """
+    logger.info(f'Init bandwith selective repeat{" (SACK)" if sack else ""}{f" (FEC {fec_k})" if fec_k else ""}')
     start_time = time.time()
     fdout = open(fileout, 'wb')
-    lfr = 0
-    laf = WINDOW_SIZE
+    lfr = offset
+    laf = offset + WINDOW_SIZE
     window = [None] * WINDOW_SIZE
     errors = 0
     recv_bytes = 0
     pckge_count = 0
     last_pckge_num = None
+    acks = 0
+    unacked = 0
+    fec = FecDecoder(fec_k) if fec_k else None
+    rebuilt = []
+    idle = 0
+
+    def ack(individual: int = None, final: bool = False) -> None:
+        # in SACK mode one acknowledgement covers every frame read while the socket had more queued
+        nonlocal acks, unacked
+        if sack:
+            if not final and unacked < ACK_BATCH and udp_connection.pending():
+                unacked += 1
+                return
+            udp_connection.send(sack_message(lfr, window))
+        elif individual is not None:
+            udp_connection.send(f"a{individual:02d}".encode())
+        else:
+            udp_connection.send(f"A{(lfr-1)%MAX_FRAME:02d}".encode())
+        acks += 1
+        unacked = 0
+
     try:
         assert laf - lfr <= WINDOW_SIZE, "everything went wrong."
         while True:
-            pckge = udp_connection.recive(package_size)
-            if not pckge: 
-                raise Exception('None received: Connection closed')
-            pckge = pckge.decode()
+            if rebuilt:
+                pckge = rebuilt.pop()
+            else:
+                if first is not None: # read by the handshake
+                    pckge, first = first, None
+                else:
+                    pckge = udp_connection.recive(package_size + FEC_HEADER if fec else package_size)
+                if not pckge: 
+                    # a quiet sender may be waiting for a lost ack: repeat it before giving up
+                    idle += 1
+                    if idle >= IDLE_TRIES:
+                        raise Exception('None received: Connection closed')
+                    ack(final=True)
+                    continue
+                idle = 0
+                pckge = pckge.decode()
+                if pckge[0] not in 'DEP':
+                    continue # late handshake message (C reply or U)
+                if fec:
+                    rebuilt = fec.add(pckge, lfr)
+                if pckge[0] == 'P':
+                    continue
             pckge_num = int(pckge[1:3])
             in_win_cond = lfr % MAX_FRAME <= pckge_num < laf % MAX_FRAME \
                             if lfr % MAX_FRAME <= laf % MAX_FRAME else \
@@ -187,12 +536,15 @@ def bandwith_selective_repeat(udp_connection: UdpConnectionInterface, package_si
                         lfr += 1
                         laf += 1
                         pckge_count += 1
-                    udp_connection.send(f"A{(lfr-1)%MAX_FRAME:02d}".encode())
+                        if fec:
+                            fec.forget((lfr - MAX_FRAME//2) % MAX_FRAME)
+                    finished = pckge[0] == 'E' or ((lfr-1)%MAX_FRAME) == last_pckge_num
+                    ack(final=finished)
                     
-                    if pckge[0] == 'E' or ((lfr-1)%MAX_FRAME) == last_pckge_num:
+                    if finished:
                         break
                 else:
-                    udp_connection.send(f"a{pckge_num:02d}".encode())
+                    ack(pckge_num)
                     if pckge[0] == 'E':
                         last_pckge_num = pckge_num
 
@@ -200,7 +552,7 @@ def bandwith_selective_repeat(udp_connection: UdpConnectionInterface, package_si
             else:
                 # logger.warning(f'Package {pckge_num} not in window')
                 errors += 1
-                udp_connection.send(f"A{(lfr-1)%MAX_FRAME:02d}".encode())          
+                ack()
     except Exception as e:
         logger.critical(f'Error in bandwith selective repeat: \n{e}')
         end_time = time.time()
@@ -208,8 +560,11 @@ def bandwith_selective_repeat(udp_connection: UdpConnectionInterface, package_si
         logger.warning(f'Received {recv_bytes} bytes')
         logger.warning(f'Errors: {errors}')
         logger.warning(f'Received packages: {pckge_count}')
+        if fec:
+            logger.warning(f'Recovered by FEC: {fec.recovered}')
+        fdout.close()
         print("0, 0, 0, 0")
-        return 
+        return None
     end_time = time.time()
     time_elapsed = end_time - start_time
     logger.info(f'Bandwith selective repeat finished in {time_elapsed:.3f} seconds')
@@ -218,7 +573,340 @@ def bandwith_selective_repeat(udp_connection: UdpConnectionInterface, package_si
     logger.info(f'Bandwith: {bandwith:.3f} MBytes/s')
     logger.info(f'Errors: {errors}')
     logger.info(f'Received packages: {pckge_count}')
+    logger.info(f'Acks sent: {acks}')
+    if fec:
+        logger.info(f'Recovered by FEC: {fec.recovered} (without waiting a retransmission)')
     print(f'{bandwith:.3g}, {recv_bytes}, {time_elapsed:.3g}, {errors}')
+    fdout.close()
+    return {'bandwith': bandwith, 'bytes': recv_bytes, 'time': time_elapsed, 'errors': errors, 'next': lfr % MAX_FRAME}
+
+def request_transfer(udp_connection: UdpConnectionInterface, n_bytes: int, package_size: int, offset: int) -> bytes:
+    """
+    Next download of a session (KEEP_OPTION accepted): N<bytes>:<offset> on the same connection, no
+    handshake. Its frames are numbered from offset on, so frames of the last transfer still in flight
+    (its E resent because the last ack was lost) fall behind the window: they are acknowledged and
+    skipped. The offset also lets the server tell a resent N from the next request
+
+    Returns:
+        bytes: the first frame of the new transfer, for bandwith_selective_repeat
+    """
+    for i in range(IDLE_TRIES):
+        udp_connection.send(f"N{n_bytes}:{offset:02d}".encode())
+        while True:
+            msg = udp_connection.recive(package_size + FEC_HEADER)
+            if not msg:
+                break # N lost, or the server is still finishing the last transfer: ask again
+            if msg[:1] not in (b'D', b'E', b'P'):
+                continue
+            if (int(msg[1:3]) - offset) % MAX_FRAME < WINDOW_SIZE:
+                return msg
+            if msg[:1] != b'P':
+                udp_connection.send(f"A{(offset-1)%MAX_FRAME:02d}".encode())
+        logger.error(f'No data after N, retrying... ({i+1})')
+    raise Exception(f'No answer to N after {IDLE_TRIES} tries')
+
+def end_session(udp_connection: UdpConnectionInterface) -> None:
+    # the server also closes the session after a while without requests, this only saves it the wait
+    udp_connection.send(END_SESSION)
+
+def make_frames(n_bytes: int, package_size: int, offset: int = 0) -> list:
+    """
+    Splits n_bytes (headers included, as the client counts them) in frames of package_size, numbered
+    from offset on
+
+    Returns:
+        list: D<nn> frames followed by a last E<nn> frame
+    """
+    payload_size = package_size - 3
+    n_frames = max(1, -(-n_bytes // package_size))
+    payload = PATTERN * (n_bytes // len(PATTERN) + 1)
+    frames = []
+    for i in range(n_frames):
+        chunk = payload[i*payload_size:min((i+1)*payload_size, n_bytes - 3*n_frames)]
+        kind = 'E' if i == n_frames - 1 else 'D'
+        frames.append(f'{kind}{(i+offset)%MAX_FRAME:02d}'.encode() + chunk)
+    return frames
+
+def parity_frame(frames: list, first: int) -> bytes:
+    """
+    FEC parity of a block: P, nn of its first frame, how many frames it covers, the XOR of their
+    lengths in 4 hex digits (frames are at most MAX_PACKAGE_SIZE long, so it is below 0x4000)
+    and the XOR of the frames themselves (headers included)
+    """
+    parity, xorlen = xor_frames(frames)
+    return f'P{first%MAX_FRAME:02d}{len(frames):02d}{xorlen:04x}'.encode() + parity
+
+def absolute(nn: int, low: int) -> int:
+    """
+    Frame number (mod MAX_FRAME) to absolute index, the first one not below low
+    """
+    return low + (nn - low) % MAX_FRAME
+
+class TokenBucket:
+    """
+    Pacer: a send of size bytes has to wait until the bucket holds that many tokens. Tokens come
+    in at rate bytes/s up to burst. Sends that can't wait (retransmissions) may leave it in debt
+
+    Args:
+        rate (float): bytes/s, 0 means no pacing
+        burst (float): max tokens, in bytes
+    """
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        if self.rate:
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def delay(self, size: int) -> float:
+        """
+        Seconds until size bytes can be sent (0 if they can go now)
+        """
+        if not self.rate:
+            return 0.0
+        self._refill()
+        return max(0.0, (size - self.tokens) / self.rate)
+
+    def consume(self, size: int) -> None:
+        self._refill()
+        self.tokens -= size
+
+class SelectiveRepeatSender:
+    """
+    Sender side of selective repeat, used by the server for downloads and by the client for uploads.
+    Every frame in flight has its own retransmission timer, all of them in a heap: the socket timeout
+    is only the time left until the next timer or the next paced send.
+    Understands the three acknowledgements: A (cumulative), a (one frame) and B (SACK bitmap)
+
+    With cc, an AIMD congestion window limits the frames in flight below window_size: slow start up
+    to ssthresh, then +1 frame per window. A loss halves it once per window (fast retransmit) or
+    drops it to 1 (timeout), and new frames are paced at PACING_GAIN*cwnd/srtt so the window is not
+    sent back to back into the bottleneck queue
+
+    Args:
+        udp_connection (UdpConnectionInterface): Connection interface used
+        frames (list): frames to send, see make_frames
+        timeout (float): retransmission timeout, in seconds
+        window_size (int): max frames in flight
+        fec_k (int): a parity frame follows the first send of every fec_k frames (never resent)
+        rate (float): fixed pacing in bytes/s, 0 sends as fast as the window (and cc) allows
+        cc (bool): use the AIMD congestion window
+        offset (int): number of the first frame, as given to make_frames
+    """
+    def __init__(self, udp_connection: UdpConnectionInterface, frames: list, timeout: float,
+                 window_size: int = None, fec_k: int = 0, rate: float = 0.0, cc: bool = False, offset: int = 0):
+        self.udp_connection = udp_connection
+        self.frames = frames
+        self.offset = offset
+        self.timeout = timeout
+        self.window_size = window_size or WINDOW_SIZE
+        self.fec_k = fec_k
+        self.cc = cc
+        frame_size = max((len(f) for f in frames), default=1)
+        self.pacer = TokenBucket(rate, PACING_BURST * frame_size)
+        self.fixed_rate = bool(rate)
+        self.acked = [False] * len(frames)
+        self.tries = [0] * len(frames)
+        self.sent_at = [0.0] * len(frames)
+        self.timers = []        # heap of (deadline, frame, try), stale entries are skipped when they expire
+        self.fast = set()       # holes already resent because of a SACK, until their next timeout
+        self.base = 0
+        self.nxt = 0
+        self.cwnd = float(INITIAL_CWND) if cc else float(self.window_size)
+        self.ssthresh = float(self.window_size)
+        self.recover = 0        # losses of frames sent before this one belong to the last reduction
+        self.srtt = None
+        self.start = time.monotonic()
+        self.trace = []         # (seconds, cwnd, ssthresh, frames in flight, srtt) at every change
+        self.stats = {'frames': len(frames), 'sent': 0, 'retransmits': 0, 'fast': 0, 'parity': 0, 'acks': 0, 'sacks': 0,
+                      'reductions': 0}
+
+    def _window(self) -> int:
+        return min(self.window_size, max(1, int(self.cwnd)))
+
+    def _trace(self) -> None:
+        if self.cc:
+            self.trace.append((time.monotonic() - self.start, self.cwnd, self.ssthresh, self.nxt - self.base, self.srtt))
+
+    def _send(self, i: int) -> None:
+        self.tries[i] += 1
+        self.sent_at[i] = time.monotonic()
+        heapq.heappush(self.timers, (self.sent_at[i] + self.timeout, i, self.tries[i]))
+        self.stats['sent'] += 1
+        self.pacer.consume(len(self.frames[i]))
+        self.udp_connection.send(self.frames[i])
+
+    def _send_new(self) -> float:
+        # returns how long the pacer makes the next new frame wait (0 if the window is what stops it)
+        n = len(self.frames)
+        while self.nxt < n and self.nxt < self.base + self._window():
+            wait = self.pacer.delay(len(self.frames[self.nxt]))
+            if wait > 0:
+                return wait
+            self._send(self.nxt)
+            self.nxt += 1
+            if self.fec_k and (self.nxt % self.fec_k == 0 or self.nxt == n):
+                first = (self.nxt - 1) // self.fec_k * self.fec_k
+                parity = parity_frame(self.frames[first:self.nxt], first + self.offset)
+                self.stats['parity'] += 1
+                self.pacer.consume(len(parity))
+                self.udp_connection.send(parity)
+        return 0.0
+
+    def _on_loss(self, i: int, timeout: bool) -> None:
+        if not self.cc or i < self.recover:
+            return
+        self.ssthresh = max(self.cwnd / 2, 2.0)
+        self.cwnd = 1.0 if timeout else self.ssthresh
+        self.recover = self.nxt
+        self.stats['reductions'] += 1
+        self._trace()
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        while self.timers and self.timers[0][0] <= now:
+            deadline, i, tries = heapq.heappop(self.timers)
+            if self.acked[i] or self.tries[i] != tries:
+                continue # already acknowledged, or the timer of an older send
+            self.stats['retransmits'] += 1
+            self.fast.discard(i)
+            self._on_loss(i, timeout=True)
+            self._send(i)
+
+    def _mark(self, i: int) -> None:
+        if self.base <= i < self.nxt and not self.acked[i]:
+            self.acked[i] = True
+            self.fast.discard(i)
+            if not self.cc:
+                return
+            if self.tries[i] == 1: # Karn: only frames sent once give an RTT sample
+                rtt = time.monotonic() - self.sent_at[i]
+                self.srtt = rtt if self.srtt is None else 0.875*self.srtt + 0.125*rtt
+            if self.cwnd < self.ssthresh:
+                self.cwnd += 1
+            else:
+                self.cwnd += 1 / self.cwnd
+            self.cwnd = min(self.cwnd, float(self.window_size))
+            if self.srtt and not self.fixed_rate:
+                self.pacer.rate = PACING_GAIN * self.cwnd * len(self.frames[i]) / self.srtt
+            self._trace()
+
+    def _fast_retransmit(self, highest: int) -> None:
+        # resend holes that already have FAST_RETRANSMIT frames after them, without waiting their timer
+        for i in range(self.base, min(highest - FAST_RETRANSMIT + 1, self.nxt)):
+            if not self.acked[i] and i not in self.fast:
+                self.fast.add(i)
+                self.stats['fast'] += 1
+                self._on_loss(i, timeout=False)
+                self._send(i)
+
+    def _index(self, nn: int, low: int) -> int:
+        # frame number to index in frames, the first one not below low
+        return absolute((nn - self.offset) % MAX_FRAME, low)
+
+    def _on_ack(self, msg: str) -> None:
+        self.stats['acks'] += 1
+        if msg[0] == 'A':
+            cum = self._index(int(msg[1:3]), self.base - 1)
+            if cum >= self.nxt:
+                return # a late ack from before base: modulo MAX_FRAME it looks like it acknowledges the window
+            for i in range(self.base, cum + 1):
+                self._mark(i)
+        elif msg[0] == 'a':
+            i = self._index(int(msg[1:3]), self.base)
+            if i < self.nxt:
+                self._mark(i)
+                self._fast_retransmit(i)
+        elif msg[0] == 'B':
+            self.stats['sacks'] += 1
+            cum, received = parse_sack(msg)
+            cum = self._index(cum, self.base - 1)
+            if cum >= self.nxt:
+                return
+            for i in range(self.base, cum + 1):
+                self._mark(i)
+            for off in received:
+                self._mark(cum + 1 + off)
+            self._fast_retransmit(max([cum + 1 + off for off in received], default=cum))
+        while self.base < len(self.frames) and self.acked[self.base]:
+            self.base += 1
+
+    def run(self) -> dict:
+        """
+        Sends every frame and waits for all of them to be acknowledged
+
+        Returns:
+            dict: transfer statistics
+        """
+        n = len(self.frames)
+        last_ack = time.monotonic()
+        self._trace()
+        while self.base < n:
+            pace = self._send_new()
+            self._expire()
+            now = time.monotonic()
+            if now - last_ack > IDLE_TRIES * self.timeout:
+                raise TimeoutError(f'no acknowledgements in {IDLE_TRIES} timeouts')
+            wake = now + self.timeout
+            if self.timers:
+                wake = min(wake, self.timers[0][0])
+            if pace:
+                wake = min(wake, now + pace)
+            self.udp_connection.settimeout(max(wake - now, 0.0001))
+            msg = self.udp_connection.recive(64)
+            if msg is None:
+                continue
+            last_ack = time.monotonic()
+            self._on_ack(msg.decode())
+        if self.cc:
+            self.stats['cwnd'] = round(self.cwnd, 1)
+            self.stats['ssthresh'] = round(self.ssthresh, 1)
+            self.stats['srtt_ms'] = round(1000*self.srtt, 3) if self.srtt else None
+        return self.stats
+
+    def write_trace(self, fileout: str) -> None:
+        """
+        Writes the cwnd/ssthresh trace as CSV
+        """
+        with open(fileout, 'w') as f:
+            f.write('time,cwnd,ssthresh,inflight,srtt\n')
+            for t, cwnd, ssthresh, inflight, srtt in self.trace:
+                f.write(f'{t:.6f},{cwnd:.3f},{ssthresh:.3f},{inflight},{"" if srtt is None else f"{srtt:.6f}"}\n')
+
+def bandwith_upload(udp_connection: UdpConnectionInterface, package_size: int, n_bytes: int, timeout: float,
+                    fec_k: int = 0, rate: float = 0.0, cc: bool = False, trace: str = None) -> None:
+    """
+    Upload mode: the client is the selective repeat sender. Prints the same report line as the
+    download, with retransmissions in the errors column
+    """
+    logger.info(f'Init upload selective repeat{f" (FEC {fec_k})" if fec_k else ""}{" (AIMD)" if cc else ""}'
+                f'{f" paced at {rate/1024/1024:.3g} MBytes/s" if rate else ""}')
+    frames = make_frames(n_bytes, package_size)
+    sent_bytes = sum(len(f) - 3 for f in frames)
+    start_time = time.time()
+    sender = SelectiveRepeatSender(udp_connection, frames, timeout, WINDOW_SIZE, fec_k, rate, cc)
+    try:
+        stats = sender.run()
+    except Exception as e:
+        logger.critical(f'Error in upload selective repeat: \n{e}')
+        logger.warning(f'Upload selective repeat finished unsucessfully in {time.time()-start_time:.3f} seconds')
+        print("0, 0, 0, 0")
+        return
+    time_elapsed = time.time() - start_time
+    bandwith = sent_bytes/time_elapsed/1024/1024
+    logger.info(f'Upload selective repeat finished in {time_elapsed:.3f} seconds')
+    logger.info(f'Sent {sent_bytes} bytes')
+    logger.info(f'Bandwith: {bandwith:.3f} MBytes/s')
+    logger.info(f'Sender stats: {stats}')
+    if trace:
+        sender.write_trace(trace)
+        logger.info(f'cwnd trace ({len(sender.trace)} points) written to {trace}')
+    print(f'{bandwith:.3g}, {sent_bytes}, {time_elapsed:.3g}, {stats["retransmits"] + stats["fast"]}')
 
 def argument_parser() -> argparse.Namespace:
     global WINDOW_SIZE
@@ -227,13 +915,27 @@ def argument_parser() -> argparse.Namespace:
     parser.add_argument('nbytes', type=int, help='Number of bytes to be received')
     parser.add_argument('timeout', type=int, help='Timeout')
     parser.add_argument('loss', type=int, help='Loss rate to be simulated')
-    parser.add_argument('fileout', type=str, help='File to be written with the received data')
+    parser.add_argument('fileout', type=str, help='File to be written with the received data (ignored with --upload)')
     parser.add_argument('host', type=str, help='Host to be connected')
     parser.add_argument('port', type=int, help='Port to connect')
     parser.add_argument('--window_sz', type=int, help='Window size', default=WINDOW_SIZE)
+    parser.add_argument('--sack', action='store_true', help='Propose block (bitmap) acknowledgements to the server')
+    parser.add_argument('--fec', type=int, metavar='K', help='Propose one XOR parity frame every K data frames', default=0)
+    parser.add_argument('--zero-rtt', action='store_true', help='Single message (Q) handshake, data starts one round trip earlier')
+    parser.add_argument('--upload', action='store_true', help='Send nbytes to the server instead of receiving them')
+    parser.add_argument('--rate', type=float, help='Upload pacing in MBytes/s (default: no pacing)', default=0.0)
+    parser.add_argument('--cc', action='store_true', help='Upload with AIMD congestion control, paced at cwnd/srtt')
+    parser.add_argument('--trace', type=str, help='Upload: write the cwnd/ssthresh trace to this CSV file', default=None)
+    parser.add_argument('--record', type=str, help='Dump every received datagram to this trace file', default=None)
+    parser.add_argument('--replay', type=str, help='Play back a trace instead of connecting (host and port are ignored)', default=None)
+    parser.add_argument('--replay-pace', action='store_true', help='Play back at the recorded pace instead of as fast as possible')
+    parser.add_argument('--profile', type=str, help='Profile the transfer phase, writing the result to this file', default=None)
+    parser.add_argument('--profile-mode', choices=['cprofile', 'sample'], help='cprofile: pstats file (default), sample: collapsed stacks', default='cprofile')
+    parser.add_argument('--profile-interval', type=float, help='Sampling interval in ms', default=1.0)
+    parser.add_argument('--trace-phases', action='store_true', help='Print the time spent in handshake, transfer and teardown')
     args = parser.parse_args()
-    if args.pack_sz < 1:
-        parser.error('Package size must be greater than 0')
+    if not 1 <= args.pack_sz <= MAX_PACKAGE_SIZE - 3:
+        parser.error(f'Package size must be between 1 and {MAX_PACKAGE_SIZE - 3}')
     if args.nbytes < 1:
         parser.error('Number of bytes must be greater than 0')
     if args.timeout < 1:
@@ -242,8 +944,16 @@ def argument_parser() -> argparse.Namespace:
         parser.error('Loss rate must be between 0 and 99')
     if not 0<= args.port <= 65535:
         parser.error('Port must be between 1 and 65535')
-    if args.window_sz < 1:
-        parser.error('Window size must be greater than 0')
+    if not 1 <= args.window_sz <= MAX_FRAME//2:
+        parser.error(f'Window size must be between 1 and {MAX_FRAME//2}')
+    if args.profile_interval <= 0:
+        parser.error('Sampling interval must be greater than 0')
+    if args.rate < 0:
+        parser.error('Rate must be positive')
+    if args.fec and not 2 <= args.fec <= args.window_sz:
+        parser.error(f'FEC block must be between 2 and {args.window_sz}')
+    if args.zero_rtt and args.upload:
+        parser.error('--zero-rtt only applies to downloads')
     WINDOW_SIZE = args.window_sz
     args.nbytes += 3*math.ceil(args.nbytes/args.pack_sz)
     args.pack_sz += 3
@@ -252,13 +962,36 @@ def argument_parser() -> argparse.Namespace:
 def main():
     args = argument_parser()
     logger.info(f' > > > Init client with args: {args}')
+    phase = PhaseTimer(args.trace_phases)
+    udp_connection = None
     try:
-        udp_connection = UdpToyConnection(args.host, args.port, args.loss, args.timeout)
-        package_size = stablish_protocol(udp_connection, args.nbytes, args.timeout, args.pack_sz)
-        print(udp_connection._socket.getsockname())
-        bandwith_selective_repeat(udp_connection, package_size, args.fileout)
+        with phase('handshake'):
+            options = (SACK_OPTION if args.sack else '') + (f'{FEC_OPTION}{args.fec:02d}' if args.fec else '')
+            if args.replay:
+                udp_connection = UdpReplayConnection(args.replay, args.replay_pace)
+            else:
+                meta = {'pack_sz': args.pack_sz, 'nbytes': args.nbytes, 'timeout': args.timeout, 'options': options,
+                        'upload': args.upload, 'zero_rtt': args.zero_rtt}
+                udp_connection = UdpToyConnection(args.host, args.port, args.loss, args.timeout, args.record, meta)
+            package_size, accepted, first = stablish_protocol(udp_connection, args.nbytes, args.timeout, args.pack_sz,
+                                                              options, args.upload, args.zero_rtt)
+            accepted = parse_options(accepted)
+        if isinstance(udp_connection, UdpToyConnection):
+            print(udp_connection._socket.getsockname())
+        with phase('transfer'):
+            if args.upload:
+                profiled(args, bandwith_upload, udp_connection, package_size, args.nbytes, args.timeout/1000,
+                         accepted.get(FEC_OPTION, 0), args.rate*1024*1024, args.cc, args.trace)
+            else:
+                profiled(args, bandwith_selective_repeat, udp_connection, package_size, args.fileout,
+                         SACK_OPTION in accepted, accepted.get(FEC_OPTION, 0), first)
     except Exception as e:
         logger.critical(f'Error in main: {e}') 
+    finally:
+        with phase('teardown'):
+            if isinstance(udp_connection, UdpToyConnection):
+                udp_connection.close()
+    phase.report()
     logger.info(f' < < < Finished client with args: {args}')
     pass
 
@@ -0,0 +1,496 @@
+#!/usr/bin/python3
+import argparse
+import collections
+import heapq
+import itertools
+import math
+import random
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError: # the batch model falls back to a (much slower) loop per combination
+    np = None
+
+# same numbering, window and retransmission rules as T1/bwc-sw.py, T3/bwc-sr.py and T3/bwc-server.py
+MAX_FRAME = 100
+WINDOW_SIZE = 50
+FAST_RETRANSMIT = 3
+IDLE_TRIES = 10
+HEADER = 3
+SW_CLIENT_TIMEOUT = 3.0     # bwc-sw.py opens its socket with a fixed 3s timeout
+
+Params = collections.namedtuple('Params', 'proto rtt bw loss reorder nbytes pack timeout window')
+Params.__doc__ = """
+    One simulated transfer
+    Args:
+        proto (str): 'sw' (bwc-sw.py against a window 1 server) or 'sr' (bwc-sr.py)
+        rtt (float): round trip propagation time, ms
+        bw (float): bottleneck capacity in each direction, Mbit/s
+        loss (float): % of datagrams lost in each direction (as the clients simulate it)
+        reorder (float): % of datagrams delayed by an extra U(0, rtt), so later ones overtake them
+        nbytes (int): payload bytes to transfer
+        pack (int): payload bytes per frame (the header adds 3)
+        timeout (float): retransmission timeout, ms (also the bwc-sr.py socket timeout)
+        window (int): sender and receiver window, frames (sw always uses 1)
+"""
+
+class Simulation:
+    """
+    Discrete-event simulation of one transfer: a heap of (time, seq, callback, args) and a virtual
+    link with serialization at the bottleneck, propagation, reordering and loss in each direction
+    """
+    DATA, ACK = 0, 1
+
+    def __init__(self, p: Params, rng: random.Random):
+        self.p = p
+        self.rng = rng
+        self.now = 0.0
+        self.events = []
+        self.seq = itertools.count()
+        self.busy = [0.0, 0.0]
+        self.rtt = p.rtt / 1000
+        self.rate = p.bw * 1e6 / 8
+
+    def at(self, t: float, fn, *args) -> None:
+        heapq.heappush(self.events, (t, next(self.seq), fn, args))
+
+    def transmit(self, direction: int, size: int, fn, *args) -> None:
+        if self.rng.random() * 100 < self.p.loss:
+            return
+        depart = max(self.now, self.busy[direction]) + size / self.rate
+        self.busy[direction] = depart
+        arrive = depart + self.rtt / 2
+        if self.p.reorder and self.rng.random() * 100 < self.p.reorder:
+            arrive += self.rng.uniform(0, self.rtt)
+        self.at(arrive, fn, *args)
+
+    def run(self, receiver, limit: float) -> None:
+        while self.events and not receiver.done and not receiver.failed:
+            t, seq, fn, args = heapq.heappop(self.events)
+            if t > limit:
+                receiver.failed = True
+                break
+            self.now = t
+            fn(*args)
+
+class Sender:
+    """
+    bwc-server.py / SelectiveRepeatSender without congestion control: per frame timers, A is
+    cumulative, a acknowledges one frame and makes older holes FAST_RETRANSMIT behind it be resent
+    """
+    def __init__(self, sim: Simulation, frames: list, timeout: float, window: int):
+        self.sim = sim
+        self.frames = frames    # (kind, nn, size)
+        self.timeout = timeout
+        self.window = window
+        self.acked = [False] * len(frames)
+        self.tries = [0] * len(frames)
+        self.fast = set()
+        self.base = self.nxt = 0
+        self.sent = 0
+        self.receiver = None
+        self.last_ack = 0.0
+        self.occupancy = 0.0    # integral of frames in flight over time
+        self.occupancy_t = 0.0
+
+    def _account(self) -> None:
+        self.occupancy += (self.sim.now - self.occupancy_t) * (self.nxt - self.base)
+        self.occupancy_t = self.sim.now
+
+    def _send(self, i: int) -> None:
+        self.tries[i] += 1
+        self.sent += 1
+        kind, nn, size = self.frames[i]
+        self.sim.transmit(Simulation.DATA, size, self.receiver.on_frame, kind, nn, size)
+        self.sim.at(self.sim.now + self.timeout, self._expire, i, self.tries[i])
+
+    def send_new(self) -> None:
+        self._account()
+        while self.nxt < len(self.frames) and self.nxt < self.base + self.window:
+            self._send(self.nxt)
+            self.nxt += 1
+
+    def _expire(self, i: int, tries: int) -> None:
+        if self.acked[i] or self.tries[i] != tries:
+            return
+        if self.sim.now - self.last_ack > IDLE_TRIES * self.timeout:
+            return # the server gives up on the client
+        self.fast.discard(i)
+        self._send(i)
+
+    def _mark(self, i: int) -> None:
+        if self.base <= i < self.nxt and not self.acked[i]:
+            self.acked[i] = True
+            self.fast.discard(i)
+
+    def on_ack(self, kind: str, nn: int) -> None:
+        self.last_ack = self.sim.now
+        self._account()
+        if kind == 'A':
+            cum = self.base - 1 + (nn - self.base + 1) % MAX_FRAME
+            if cum >= self.nxt:
+                return # late ack from before base
+            for i in range(self.base, cum + 1):
+                self._mark(i)
+        else:
+            i = self.base + (nn - self.base) % MAX_FRAME
+            if i < self.nxt:
+                self._mark(i)
+                for j in range(self.base, min(i - FAST_RETRANSMIT + 1, self.nxt)):
+                    if not self.acked[j] and j not in self.fast:
+                        self.fast.add(j)
+                        self._send(j)
+        while self.base < len(self.frames) and self.acked[self.base]:
+            self.base += 1
+        self.send_new()
+
+class Receiver:
+    def __init__(self, sim: Simulation, sender: Sender):
+        self.sim = sim
+        self.sender = sender
+        self.start = self.finish = None # timed from the first data frame, read by stablish_protocol
+        self.recv_bytes = 0
+        self.errors = 0
+        self.acks = 0
+        self.done = False
+        self.failed = False
+
+    def ack(self, kind: str, nn: int) -> None:
+        self.acks += 1
+        self.sim.transmit(Simulation.ACK, HEADER, self.sender.on_ack, kind, nn)
+
+class SwReceiver(Receiver):
+    """
+    bandwith_stop_and_wait from T1/bwc-sw.py
+    """
+    def __init__(self, sim: Simulation, sender: Sender):
+        Receiver.__init__(self, sim, sender)
+        self.expected = 0
+        self.last = 0.0
+
+    def on_frame(self, kind: str, nn: int, size: int) -> None:
+        if self.done:
+            return
+        self.last = self.sim.now
+        self.sim.at(self.sim.now + SW_CLIENT_TIMEOUT, self._timeout, self.sim.now)
+        if self.start is None:
+            self.start = self.sim.now
+        if kind == 'E': # acknowledged and done, its payload is never written
+            self.ack('A', nn)
+            self.done = True
+            self.finish = self.sim.now
+        elif nn != self.expected:
+            self.errors += 1
+            self.ack('A', nn)
+        else:
+            self.ack('A', nn)
+            self.expected = (self.expected + 1) % MAX_FRAME
+            self.recv_bytes += size - HEADER
+
+    def _timeout(self, armed: float) -> None:
+        if self.last == armed and not self.done: # recv timeout: bwc-sw.py exits
+            self.failed = True
+
+class SrReceiver(Receiver):
+    """
+    bandwith_selective_repeat from T3/bwc-sr.py (without SACK or FEC)
+    """
+    def __init__(self, sim: Simulation, sender: Sender, window: int, timeout: float):
+        Receiver.__init__(self, sim, sender)
+        self.window = [None] * window
+        self.lfr = 0
+        self.laf = window
+        self.last_pckge_num = None
+        self.timeout = timeout
+        self.last = 0.0
+        self.idle = 0
+
+    def on_frame(self, kind: str, nn: int, size: int) -> None:
+        if self.done:
+            return
+        self.last = self.sim.now
+        self.idle = 0
+        self.sim.at(self.sim.now + self.timeout, self._timeout, self.sim.now)
+        if self.start is None:
+            self.start = self.sim.now
+        lfr, laf = self.lfr % MAX_FRAME, self.laf % MAX_FRAME
+        in_win = lfr <= nn < laf if lfr <= laf else not laf <= nn < lfr
+        if not in_win:
+            self.errors += 1
+            self.ack('A', (self.lfr - 1) % MAX_FRAME)
+            return
+        self.window[(nn - lfr) % MAX_FRAME] = (kind, size)
+        if nn == lfr:
+            while self.window[0] is not None:
+                self.recv_bytes += self.window[0][1] - HEADER
+                self.window.pop(0)
+                self.window.append(None)
+                self.lfr += 1
+                self.laf += 1
+            self.ack('A', (self.lfr - 1) % MAX_FRAME)
+            if kind == 'E' or (self.lfr - 1) % MAX_FRAME == self.last_pckge_num:
+                self.done = True
+                self.finish = self.sim.now
+        else:
+            self.ack('a', nn)
+            if kind == 'E':
+                self.last_pckge_num = nn
+
+    def _timeout(self, armed: float) -> None:
+        if self.last != armed or self.done:
+            return
+        self.idle += 1
+        if self.idle >= IDLE_TRIES:
+            self.failed = True
+            return
+        self.ack('A', (self.lfr - 1) % MAX_FRAME) # the sender may be waiting for a lost ack
+        self.last = self.sim.now
+        self.sim.at(self.sim.now + self.timeout, self._timeout, self.sim.now)
+
+def make_frames(nbytes: int, pack: int) -> list:
+    n = max(1, math.ceil(nbytes / pack))
+    return [('E' if i == n - 1 else 'D', i % MAX_FRAME, HEADER + min(pack, nbytes - i*pack)) for i in range(n)]
+
+def simulate(p: Params, seed: int = None, limit: float = 60.0) -> dict:
+    """
+    Exact (event by event) simulation of one transfer, given up after limit simulated seconds
+    (a timeout below the queueing delay keeps the link busy with spurious copies)
+
+    Returns:
+        dict: MBps (payload, as the client reports it), time (s), retransmits, errors (receiver
+            side discards), occupancy (mean frames in flight), acks, ok
+    """
+    sim = Simulation(p, random.Random(seed))
+    frames = make_frames(p.nbytes, p.pack)
+    window = 1 if p.proto == 'sw' else p.window
+    sender = Sender(sim, frames, p.timeout / 1000, window)
+    if p.proto == 'sw':
+        receiver = SwReceiver(sim, sender)
+    else:
+        receiver = SrReceiver(sim, sender, window, p.timeout / 1000)
+    sender.receiver = receiver
+    sender.send_new()
+    sim.run(receiver, limit)
+    ok = receiver.done and not receiver.failed
+    elapsed = (receiver.finish - receiver.start) if ok else float('nan')
+    return {
+        'MBps': receiver.recv_bytes / elapsed / 1024 / 1024 if ok and elapsed > 0 else float('nan'),
+        'time': elapsed,
+        'retransmits': sender.sent - len(frames),
+        'errors': receiver.errors,
+        'occupancy': sender.occupancy / sender.occupancy_t if sender.occupancy_t else 0.0,
+        'acks': receiver.acks,
+        'ok': ok,
+    }
+
+# --- batch model ---
+# Instead of events, one recurrence per frame: first send s_i (after s_{i-1} plus serialization, and
+# once the window base passed i-W), first arrival d_i (geometric number of tries, the second one after a
+# fast retransmit if the window has frames behind it) and the time the sender knows it arrived. Every
+# combination advances in lockstep, so with NumPy each frame is a handful of vector operations
+
+def _geometric(rng: random.Random, q: float) -> int: # tries until the first success, success prob q
+    if q >= 1:
+        return 1
+    return 1 + int(math.log(1 - rng.random()) / math.log(1 - q))
+
+def predict(p: Params, rng: random.Random) -> dict:
+    """
+    Batch model for one combination, pure Python (used when NumPy is not installed)
+    """
+    window = 1 if p.proto == 'sw' else p.window
+    n = max(1, math.ceil(p.nbytes / p.pack))
+    rtt, timeout = p.rtt / 1000, p.timeout / 1000
+    ser = (p.pack + HEADER) / (p.bw * 1e6 / 8)
+    loss = p.loss / 100
+    # a fast retransmission waits for the a of the frame FAST_RETRANSMIT behind, then queues behind the window
+    fr = min(timeout, rtt + (FAST_RETRANSMIT + 1) * ser + max(0.0, (window - 1) * ser - rtt)) if window > 1 else timeout
+    known = []
+    cum = 0.0
+    s = h = 0.0
+    late = []   # spurious copies of each frame, they queue up about a window later
+    retransmits = 0
+    start = finish = 0.0
+    inflight = 0.0
+    for i in range(n):
+        if i > 0:
+            h = known[i - window] if i >= window else 0.0  # handed to the socket when the window opens
+            carry = late[i - window] * ser if i >= window else 0.0
+            s = max(s + ser + carry, h)                     # and queued behind the previous ones
+        k = _geometric(rng, 1 - loss)
+        jitter = rng.uniform(0, rtt) if p.reorder and rng.random() * 100 < p.reorder else 0.0
+        arrive = s + ser + rtt / 2 + jitter
+        if i == 0: # the clock starts with the first frame that arrives, the next one if this is lost
+            start = arrive + (k - 1) * timeout if window == 1 else arrive + (ser if k > 1 else 0.0)
+        tail = i >= n - FAST_RETRANSMIT # no a acks behind the last frames: only their timer resends them
+        d = arrive + ((timeout if tail else fr) if k > 1 else 0.0) + max(k - 2, 0) * timeout
+        retries = k - 1
+        last_send = d - ser - rtt / 2 - jitter
+        ack = d + rtt / 2
+        if rng.random() < loss: # its own ack is lost
+            if window == 1: # nobody else will acknowledge it: resend after the timeout until an ack survives
+                rounds = _geometric(rng, (1 - loss)**2)
+                ack = last_send + rounds * timeout + rtt + ser
+                retries += rounds
+            elif cum > ack or cum > last_send + timeout: # behind a hole the next a acks fast retransmit it,
+                retries += 1                             # otherwise its timer may expire before the next A
+        cum = max(cum, ack)
+        late.append(max(0, int((cum - h) / timeout) - retries)) # its timer expired while queued or in flight
+        retransmits += retries + late[-1]
+        known.append(cum)
+        finish = max(finish, d)
+        inflight += cum - h
+    elapsed = finish - start
+    payload = p.nbytes - (min(p.pack, p.nbytes - (n - 1) * p.pack) if p.proto == 'sw' else 0) # bwc-sw.py drops E
+    return {'MBps': payload / elapsed / 1024 / 1024 if elapsed > 0 else float('nan'), 'time': elapsed,
+            'retransmits': retransmits, 'occupancy': inflight / max(known[-1], 1e-12)}
+
+def predict_batch(combos: list, seed: int = None) -> list:
+    """
+    Batch model for many combinations at once, vectorized with NumPy when available
+    """
+    if np is None:
+        rng = random.Random(seed)
+        return [predict(p, rng) for p in combos]
+    rng = np.random.default_rng(seed)
+    m = len(combos)
+    col = lambda name: np.array([getattr(p, name) for p in combos], dtype=float)
+    window = np.array([1 if p.proto == 'sw' else p.window for p in combos])
+    pack, nbytes = col('pack'), col('nbytes')
+    n = np.maximum(1, np.ceil(nbytes / pack)).astype(int)
+    rtt, timeout = col('rtt') / 1000, col('timeout') / 1000
+    ser = (pack + HEADER) / (col('bw') * 1e6 / 8)
+    loss = col('loss') / 100
+    reorder = col('reorder') / 100
+    queued = np.maximum(0.0, (window - 1) * ser - rtt)
+    fr = np.where(window > 1, np.minimum(timeout, rtt + (FAST_RETRANSMIT + 1) * ser + queued), timeout)
+    nmax = n.max()
+    known = np.zeros((nmax, m))
+    rows = np.arange(m)
+    cum = np.zeros(m)
+    s = np.zeros(m)
+    h = np.zeros(m)
+    late = np.zeros((nmax, m))
+    retransmits = np.zeros(m)
+    start = np.zeros(m)
+    finish = np.zeros(m)
+    inflight = np.zeros(m)
+    for i in range(nmax):
+        active = i < n
+        if i > 0:
+            behind = known[np.maximum(i - window, 0), rows]
+            h = np.where(i >= window, behind, 0.0)
+            carry = np.where(i >= window, late[np.maximum(i - window, 0), rows] * ser, 0.0)
+            s = np.where(active, np.maximum(s + ser + carry, h), s)
+        k = rng.geometric(1 - np.minimum(loss, 0.999999), m)
+        jitter = np.where(rng.random(m) < reorder, rng.uniform(0, 1, m) * rtt, 0.0)
+        arrive = s + ser + rtt / 2 + jitter
+        if i == 0:
+            start = np.where(window == 1, arrive + (k - 1) * timeout, arrive + np.where(k > 1, ser, 0.0))
+        first_retry = np.where(i >= n - FAST_RETRANSMIT, timeout, fr)
+        d = arrive + np.where(k > 1, first_retry, 0.0) + np.maximum(k - 2, 0) * timeout
+        retries = k - 1
+        last_send = d - ser - rtt / 2 - jitter
+        ack = d + rtt / 2
+        ack_lost = rng.random(m) < loss
+        rounds = rng.geometric(np.maximum((1 - loss)**2, 1e-6), m)
+        sw_lost = ack_lost & (window == 1)
+        ack = np.where(sw_lost, last_send + rounds * timeout + rtt + ser, ack)
+        spurious = ack_lost & (window > 1) & ((cum > ack) | (cum > last_send + timeout))
+        retries = retries + np.where(sw_lost, rounds, 0) + spurious
+        cum = np.where(active, np.maximum(cum, ack), cum)
+        late[i] = np.maximum(0, np.floor((cum - h) / timeout) - retries)
+        retries = retries + late[i]
+        known[i] = cum
+        retransmits += np.where(active, retries, 0)
+        finish = np.where(active, np.maximum(finish, d), finish)
+        inflight += np.where(active, cum - h, 0.0)
+    elapsed = finish - start
+    last_payload = nbytes - (n - 1) * pack
+    payload = nbytes - np.where(window == 1, last_payload, 0)
+    mbps = payload / np.where(elapsed > 0, elapsed, np.nan) / 1024 / 1024
+    occupancy = inflight / np.maximum(known[n - 1, rows], 1e-12)
+    return [{'MBps': float(mbps[j]), 'time': float(elapsed[j]), 'retransmits': int(retransmits[j]),
+             'occupancy': float(occupancy[j])} for j in range(m)]
+
+# --- command line ---
+
+COLUMNS = ['proto', 'rtt', 'bw', 'loss', 'reorder', 'nbytes', 'pack', 'timeout', 'window']
+
+def argument_parser() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Stop-and-wait vs selective repeat simulator. Every parameter takes '
+                                                 'several values: the cartesian product is evaluated')
+    parser.add_argument('--proto', nargs='+', choices=['sw', 'sr'], default=['sw', 'sr'])
+    parser.add_argument('--rtt', type=float, nargs='+', default=[1.0], help='Round trip time, ms')
+    parser.add_argument('--bw', type=float, nargs='+', default=[100.0], help='Bottleneck, Mbit/s')
+    parser.add_argument('--loss', type=float, nargs='+', default=[0.0], help='Loss in each direction, %%')
+    parser.add_argument('--reorder', type=float, nargs='+', default=[0.0], help='Delayed (reordered) datagrams, %%')
+    parser.add_argument('--nbytes', type=int, nargs='+', default=[1000000], help='Bytes to transfer')
+    parser.add_argument('--pack', type=int, nargs='+', default=[1000], help='Payload bytes per frame')
+    parser.add_argument('--timeout', type=float, nargs='+', default=[50.0], help='Retransmission timeout, ms')
+    parser.add_argument('--window', type=int, nargs='+', default=[WINDOW_SIZE], help='Window, frames (sr only)')
+    parser.add_argument('--exact', action='store_true', help='Event by event simulation of every combination (slow)')
+    parser.add_argument('--validate', type=int, default=0, metavar='N',
+                        help='Also simulate N random combinations exactly and report the batch model error')
+    parser.add_argument('--limit', type=float, default=60.0, help='Exact mode: simulated seconds before a transfer counts as failed')
+    parser.add_argument('--runs', type=int, default=1, help='Runs averaged per combination')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    if any(w < 1 or w >= MAX_FRAME for w in args.window):
+        parser.error(f'Window must be between 1 and {MAX_FRAME-1}')
+    if any(not 0 <= l < 100 for l in args.loss):
+        parser.error('Loss must be between 0 and 99')
+    if min(args.bw) <= 0 or min(args.pack) < 1 or min(args.nbytes) < 1 or min(args.timeout) <= 0:
+        parser.error('bw, pack, nbytes and timeout must be greater than 0')
+    return args
+
+def average(results: list) -> dict:
+    ok = [r for r in results if r['MBps'] == r['MBps']] # failed transfers are nan
+    keys = ['MBps', 'time', 'retransmits', 'occupancy']
+    if not ok:
+        return {key: float('nan') for key in keys}
+    return {key: sum(r[key] for r in ok) / len(ok) for key in keys}
+
+def exact(p: Params, runs: int, seed: int, limit: float) -> dict:
+    return average([simulate(p, None if seed is None else seed + r, limit) for r in range(runs)])
+
+def main():
+    args = argument_parser()
+    combos = []
+    for values in itertools.product(*[getattr(args, c) for c in COLUMNS]):
+        p = Params(*values)
+        if p.proto == 'sw' and p.window != args.window[0]:
+            continue # the window does not apply to stop-and-wait
+        combos.append(p._replace(window=1) if p.proto == 'sw' else p)
+
+    start = time.perf_counter()
+    if args.exact:
+        results = [exact(p, args.runs, args.seed, args.limit) for p in combos]
+    else:
+        batch = predict_batch([p for p in combos for r in range(args.runs)], args.seed)
+        results = [average(batch[j*args.runs:(j+1)*args.runs]) for j in range(len(combos))]
+    elapsed = time.perf_counter() - start
+
+    print(','.join(COLUMNS + ['MBps', 'time', 'retransmits', 'occupancy']))
+    for p, r in zip(combos, results):
+        print(','.join(str(v) for v in p) + f',{r["MBps"]:.4g},{r["time"]:.4g},{r["retransmits"]:.4g},{r["occupancy"]:.3g}')
+    mode = 'exact' if args.exact else f'batch ({"numpy" if np is not None else "pure python"})'
+    print(f'{len(combos)} combinations in {elapsed:.2f}s, {mode}', file=sys.stderr)
+
+    if args.validate and not args.exact:
+        rng = random.Random(args.seed)
+        errors = []
+        for j in rng.sample(range(len(combos)), min(args.validate, len(combos))):
+            ref = exact(combos[j], max(args.runs, 3), args.seed, args.limit)
+            if ref['time'] == ref['time'] and results[j]['time'] == results[j]['time']:
+                # mean time, not mean MBps: a few lucky runs without timeouts dominate the latter
+                errors.append(abs(results[j]['time'] - ref['time']) / ref['time'])
+                print(f'validate {",".join(str(v) for v in combos[j])}: batch {results[j]["time"]:.4g}s '
+                      f'exact {ref["time"]:.4g}s', file=sys.stderr)
+        if errors:
+            print(f'batch model time error: mean {100*sum(errors)/len(errors):.1f}%, max {100*max(errors):.1f}%', file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
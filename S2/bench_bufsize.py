@@ -0,0 +1,57 @@
+#!/usr/bin/python3
+# Benchmark de tamaños de lectura: cuántas llamadas a recv (syscalls) y MB/s
+# se necesitan para recibir una transferencia grande por TCP en localhost
+# Uso: bench_bufsize.py [Mbytes] [rcvbuf]
+import jsockets
+import sys, threading
+import time
+
+SIZES = [1024, 4096, 16*1024, 64*1024, 256*1024, 1024*1024]
+
+def sender(s, total):
+    buf = bytearray(1024*1024)
+    sent = 0
+    while sent < total:
+        s.sendall(buf)
+        sent += len(buf)
+    s.close()
+
+def run(total, size, adaptive, rcvbuf):
+    srv = jsockets.socket_tcp_bind(0, rcvbuf=rcvbuf)
+    if srv is None:
+        print('could not open socket')
+        sys.exit(1)
+    port = srv.getsockname()[1]
+    c = jsockets.socket_tcp_connect('localhost', port)
+    conn, addr = srv.accept()
+    srv.close()
+
+    t = threading.Thread(target=sender, args=(c, total))
+    start = time.time()
+    t.start()
+    rd = jsockets.Reader(conn, size, adaptive)
+    n = 0
+    calls = 0
+    while True:
+        data = rd.recv()
+        calls += 1
+        if not data: break
+        n += len(data)
+    elapsed = time.time() - start
+    t.join()
+    conn.close()
+    mb = n/1024/1024
+    return calls/mb, mb/elapsed
+
+if len(sys.argv) > 3:
+    print('Use: '+sys.argv[0]+' [Mbytes] [rcvbuf]')
+    sys.exit(1)
+total = int(sys.argv[1] if len(sys.argv) > 1 else 200)*1024*1024
+rcvbuf = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+
+print(f'{"bufsize":>10} {"modo":>9} {"recv/MB":>10} {"MB/s":>10}')
+for size in SIZES:
+    calls, bw = run(total, size, False, rcvbuf)
+    print(f'{size:>10} {"fijo":>9} {calls:>10.1f} {bw:>10.1f}')
+calls, bw = run(total, 1024, True, rcvbuf)
+print(f'{"1024->":>10} {"adaptive":>9} {calls:>10.1f} {bw:>10.1f}')
@@ -0,0 +1,72 @@
+#!/usr/bin/python3
+# Prueba en loopback de multicast: un emisor, varios receptores en la misma máquina
+# Verifica que a todos les llega el stream completo (reporta lo que le falta a cada uno) y compara la CPU del emisor contra mandar N copias unicast
+# Uso: bench_multicast.py [receptores] [paquetes] [tamaño]
+import jsockets
+import sys, threading
+import time
+
+GROUP = '239.1.2.3'
+PORT = 5007
+IFACE = '127.0.0.1' # en loopback hay que elegir la interfaz a mano
+
+def receiver(s, count, idx):
+    s.settimeout(1)
+    n = 0
+    try:
+        while True:
+            data = s.recv(65536)
+            if data == b'fin': break
+            n += 1
+    except OSError:
+        pass
+    count[idx] = n
+    s.close()
+
+def run(multicast, nrecv, npkts, size):
+    if multicast:
+        socks = [jsockets.socket_udp_multicast_bind(GROUP, PORT, iface=IFACE, rcvbuf=4*1024*1024) for i in range(nrecv)]
+        outs = [jsockets.socket_udp_multicast_send(GROUP, PORT, iface=IFACE)]
+    else:
+        socks = [jsockets.socket_udp_bind(0, rcvbuf=4*1024*1024) for i in range(nrecv)]
+        outs = [jsockets.socket_udp_connect('127.0.0.1', s.getsockname()[1]) for s in socks]
+    if None in socks or None in outs:
+        print('could not open socket')
+        sys.exit(1)
+    count = [0]*nrecv
+    threads = [threading.Thread(target=receiver, args=(s, count, i)) for i, s in enumerate(socks)]
+    for t in threads: t.start()
+
+    buf = bytes(size)
+    cpu = time.thread_time() # sólo la CPU de este thread, el emisor
+    start = time.time()
+    for i in range(npkts):
+        for o in outs:
+            o.send(buf)
+        if i % 64 == 63:
+            time.sleep(0) # le doy una oportunidad a los receptores
+    cpu = time.thread_time() - cpu
+    elapsed = time.time() - start
+    for o in outs:
+        o.send(b'fin')
+        o.close()
+    for t in threads: t.join()
+    return count, cpu, elapsed
+
+if len(sys.argv) > 4:
+    print('Use: '+sys.argv[0]+' [receptores] [paquetes] [tamaño]')
+    sys.exit(1)
+nrecv = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+npkts = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+size = int(sys.argv[3]) if len(sys.argv) > 3 else 1000
+
+mb = npkts*size/1024/1024
+print(f'{nrecv} receptores, {npkts} paquetes de {size} bytes ({mb:.1f} MB por receptor)')
+print(f'{"modo":>10} {"recibidos":>30} {"CPU emisor":>11} {"CPU/MB":>9} {"tiempo":>8}')
+for multicast in (True, False):
+    count, cpu, elapsed = run(multicast, nrecv, npkts, size)
+    name = 'multicast' if multicast else 'unicast'
+    print(f'{name:>10} {str(count):>30} {cpu:>10.3f}s {1000*cpu/mb:>7.2f}ms {elapsed:>7.3f}s')
+    for i, n in enumerate(count):
+        if n < npkts: # UDP no reintenta: lo que se pierde (buffer lleno) no llega nunca
+            print(f'{name}: al receptor {i} le faltaron {npkts - n} de {npkts} paquetes ({100*(npkts - n)/npkts:.1f}%)')
@@ -0,0 +1,255 @@
+#!/usr/bin/python3
+# Benchmark comparativo de las arquitecturas de servidor de eco
+# Lanza cada servidor en localhost (port 1818), lo carga con distintas cantidades de conexiones
+# y tamaños de mensaje, y muestra una tabla con conexiones/s, mensajes/s, percentiles de latencia,
+# memoria (RSS máxima, sumando los procesos hijos) y CPU usada por el servidor.
+# "stall" son las conexiones que conectaron pero no recibieron ningún eco (p.ej. en la cola del listen).
+# RSS y CPU se leen de /proc, así que sólo salen en Linux
+# Uso: bench_servers.py [-c 1 10 100] [-s 64 1024] [-d depth] [-t segundos] [--servers ...]
+import jsockets
+import loadgen_echo
+import sys, os, time, struct, signal, socket
+import subprocess, threading, argparse, selectors
+
+PORT = 1818
+HERE = os.path.dirname(os.path.abspath(__file__))
+SERVERS = { # nombre: (programa, protocolo)
+    'iterativo':     ('server_echo.py', 'tcp'),
+    'fork':          ('server_echo2.py', 'tcp'),
+    'fork-max':      ('server_echo2.5.py', 'tcp'),
+    'threads':       ('../EX/C1/server_echo4.py', 'tcp'),
+    'select':        ('server_echo6.py', 'tcp'),
+    'select-zc':     ('server_echo_zc.py', 'tcp'),
+    'asyncio':       ('server_echo_async.py', 'tcp'),
+    'udp':           ('server_echo_udp.py', 'udp'),
+    'udp-threads':   ('server_echo_udp2.py', 'udp'),
+    'udp-asyncio':   ('server_echo_udp_async.py', 'udp'),
+}
+UDP_LOSS_TIMEOUT = 0.5 # un datagrama sin eco después de esto se cuenta perdido
+UDP_HDR = struct.Struct('!QQ') # secuencia, perf_counter_ns
+
+# --- medición del proceso servidor (y sus hijos) ---
+
+def _tree(pid): # pid y todos sus descendientes
+    pids = [pid]
+    for p in pids:
+        try:
+            for tid in os.listdir(f'/proc/{p}/task'):
+                with open(f'/proc/{p}/task/{tid}/children') as f:
+                    pids += [int(c) for c in f.read().split()]
+        except OSError:
+            pass
+    return pids
+
+def _cpu(pid): # segundos de CPU del árbol, incluyendo hijos que ya murieron (cutime/cstime)
+    total = 0
+    tick = os.sysconf('SC_CLK_TCK')
+    for i, p in enumerate(_tree(pid)):
+        try:
+            with open(f'/proc/{p}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        total += int(fields[11]) + int(fields[12]) # utime, stime
+        if i == 0:
+            total += int(fields[13]) + int(fields[14])
+    return total / tick
+
+def _rss(pid): # Kbytes
+    total = 0
+    for p in _tree(pid):
+        try:
+            with open(f'/proc/{p}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+        except OSError:
+            pass
+    return total
+
+class Monitor(threading.Thread): # muestrea la RSS máxima mientras corre la carga
+    def __init__(self, pid):
+        threading.Thread.__init__(self, daemon=True)
+        self.pid = pid
+        self.max_rss = 0
+        self.stop = threading.Event()
+        self.cpu0 = _cpu(pid)
+        self.cpu = 0.0
+
+    def run(self):
+        while not self.stop.wait(0.1):
+            self.max_rss = max(self.max_rss, _rss(self.pid))
+
+    def finish(self):
+        self.max_rss = max(self.max_rss, _rss(self.pid))
+        self.cpu = _cpu(self.pid) - self.cpu0
+        self.stop.set()
+        self.join()
+
+# --- carga ---
+
+def connection_rate(duration): # connect + un eco + close, una tras otra
+    n = 0
+    end = time.perf_counter() + duration
+    start = time.perf_counter()
+    while time.perf_counter() < end:
+        s = jsockets.socket_tcp_connect('localhost', PORT, nodelay=1, timeout=1.0)
+        if s is None:
+            break
+        try:
+            s.settimeout(1.0)
+            jsockets.send_msg(s, b'x')
+            if jsockets.recv_msgs(s, jsockets.FrameDecoder()) is None:
+                break
+            s.shutdown(socket.SHUT_WR)
+            s.recv(1) # espero el EOF del servidor: así no queda en TIME_WAIT del lado del servidor
+        except OSError:
+            break
+        finally:
+            s.close()
+        n += 1
+    return n / (time.perf_counter() - start)
+
+def run_udp(conns, depth, size, duration):
+    size = max(size, UDP_HDR.size)
+    padding = b'x'*(size - UDP_HDR.size)
+    sel = selectors.DefaultSelector()
+    socks = []
+    echoes = {} # socket -> ecos recibidos
+    for i in range(conns):
+        s = jsockets.socket_udp_connect('localhost', PORT)
+        if s is None:
+            continue
+        # primero un paquete y su eco: server_echo_udp2 necesita crear el socket del cliente
+        s.settimeout(1.0)
+        try:
+            s.send(b'hola')
+            s.recv(65536)
+        except OSError:
+            s.close()
+            continue
+        s.setblocking(False)
+        socks.append(s)
+        sel.register(s, selectors.EVENT_READ, {})
+        echoes[s] = 0
+
+    rtts = []
+    lost = 0
+    seq = 0
+    start = time.perf_counter()
+    end = start + duration
+    while socks and time.perf_counter() < end:
+        now = time.perf_counter_ns()
+        for s in socks:
+            out = sel.get_key(s).data # seq -> hora de envío
+            for q in [q for q, t in out.items() if now - t > UDP_LOSS_TIMEOUT*1e9]:
+                del out[q]
+                lost += 1
+            while len(out) < depth:
+                out[seq] = time.perf_counter_ns()
+                try:
+                    s.send(UDP_HDR.pack(seq, out[seq]) + padding)
+                except OSError:
+                    pass # buffer lleno o ICMP de un envío anterior: cuenta como pérdida después
+                seq += 1
+        for key, mask in sel.select(timeout=0.05):
+            while True:
+                try:
+                    data = key.fileobj.recv(65536)
+                except OSError:
+                    break
+                if len(data) < UDP_HDR.size:
+                    continue
+                q, t = UDP_HDR.unpack_from(data)
+                if key.data.pop(q, None) is not None:
+                    rtts.append(time.perf_counter_ns() - t)
+                    echoes[key.fileobj] += 1
+    elapsed = time.perf_counter() - start
+    stalled = sum(1 for n in echoes.values() if n == 0)
+    for s in socks:
+        sel.unregister(s)
+        s.close()
+    sel.close()
+    rtts.sort()
+    p = loadgen_echo.percentile
+    return {
+        'conns': len(socks),
+        'msgs': len(rtts),
+        'req/s': len(rtts)/elapsed,
+        'p50': p(rtts, 50)/1000, 'p90': p(rtts, 90)/1000, 'p99': p(rtts, 99)/1000, 'p999': p(rtts, 99.9)/1000,
+        'errors': lost,
+        'stalled': stalled,
+    }
+
+# --- servidores ---
+
+def start_server(prog):
+    # sesión nueva: al terminar mato el grupo completo, incluyendo los hijos de los que hacen fork
+    server = subprocess.Popen([sys.executable, os.path.join(HERE, prog)], cwd=HERE, start_new_session=True,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time.sleep(0.5)
+    return server
+
+def stop_server(server):
+    try:
+        os.killpg(server.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+    server.wait()
+    time.sleep(0.2)
+
+def bench(name, args):
+    prog, proto = SERVERS[name]
+    rows = []
+    server = start_server(prog)
+    try:
+        if server.poll() is not None:
+            print(f'{name}: el servidor no partió')
+            return rows
+        rate = connection_rate(min(args.time, 2.0)) if proto == 'tcp' else float('nan')
+        for conns in args.conns:
+            for size in args.sizes:
+                if server.poll() is not None:
+                    print(f'{name}: el servidor murió')
+                    return rows
+                mon = Monitor(server.pid)
+                mon.start()
+                if proto == 'tcp':
+                    r = loadgen_echo.run('localhost', PORT, conns, args.depth, size, args.time)
+                else:
+                    r = run_udp(conns, args.depth, size, args.time)
+                mon.finish()
+                rows.append((name, conns, size, rate, r, mon.max_rss/1024, mon.cpu))
+                print(row(*rows[-1]), flush=True)
+    finally:
+        stop_server(server)
+    return rows
+
+HEADER = (f'{"servidor":>12} {"conns":>6} {"size":>6} {"conn/s":>8} {"msgs/s":>9} {"p50 us":>8} {"p99 us":>8} '
+          f'{"p999 us":>8} {"err":>5} {"stall":>5} {"RSS MB":>7} {"CPU s":>6}')
+
+def row(name, conns, size, rate, r, rss, cpu):
+    return (f'{name:>12} {r["conns"]:>6} {size:>6} {rate:>8.0f} {r["req/s"]:>9.0f} {r["p50"]:>8.0f} {r["p99"]:>8.0f} '
+            f'{r["p999"]:>8.0f} {r["errors"]:>5} {r["stalled"]:>5} {rss:>7.1f} {cpu:>6.2f}')
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark comparativo de los servidores de eco')
+    parser.add_argument('-c', '--conns', type=int, nargs='+', default=[1, 10, 100], help='conexiones simultáneas')
+    parser.add_argument('-s', '--sizes', type=int, nargs='+', default=[64, 1024], help='tamaños de mensaje')
+    parser.add_argument('-d', '--depth', type=int, default=4, help='mensajes en vuelo por conexión')
+    parser.add_argument('-t', '--time', type=float, default=3.0, help='segundos por medición')
+    parser.add_argument('--servers', nargs='+', choices=list(SERVERS), default=list(SERVERS), help='servidores a medir')
+    args = parser.parse_args()
+
+    print(HEADER)
+    rows = []
+    for name in args.servers:
+        rows += bench(name, args)
+    if len(rows) > 1:
+        print('\nResumen (ordenado por msgs/s):')
+        print(HEADER)
+        for r in sorted(rows, key=lambda r: -r[4]['req/s']):
+            print(row(*r))
+
+if __name__ == '__main__':
+    main()
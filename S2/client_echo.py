@@ -8,6 +8,6 @@ if s is None:
     sys.exit(1)
 
 s.send(b'hola')
-data = s.recv(1024)
+data = s.recv(jsockets.BUFSIZE)
 s.close()
 print('Received', repr(data))
@@ -8,7 +8,7 @@ import time
 def Rdr(s):
     while True:
         try:
-            data=s.recv(1500).decode()
+            data=s.recv(jsockets.BUFSIZE).decode()
         except:
             data = None
         if not data: 
@@ -1,32 +1,198 @@
 #!/usr/bin/python3
 # Echo client program
 # Version con dos threads: uno lee de stdin hacia el socket y el otro al revés
+# Con --reliable: pedidos numerados con ventana, retransmisión por timeout y supresión de duplicados
 import jsockets
 import sys, threading
-import time
+import time, random, struct, heapq, queue, argparse
+
+SEQ = struct.Struct('!I') # número de secuencia al inicio de cada pedido, el eco lo devuelve igual
+MIN_RTO = 0.05
+MAX_RTO = 3.0
 
 def Rdr(s):
     while True:
         try:
-            data=s.recv(1500).decode()
+            data=s.recv(jsockets.BUFSIZE).decode()
         except:
             data = None
-        if not data: 
+        if not data:
             break
         print(data, end = '')
 
-if len(sys.argv) != 3:
-    print('Use: '+sys.argv[0]+' host port')
-    sys.exit(1)
+def stdin_reader(q):
+    for line in sys.stdin:
+        q.put(line.encode())
+    q.put(None)
+
+class ReliableEcho:
+    """
+    Pedido/respuesta confiable sobre UDP: hasta window pedidos en vuelo, cada uno con su timer
+    de retransmisión (un heap con todos los timers), RTO adaptivo a la RFC 6298 y los ecos
+    duplicados (por retransmisiones de más) se descartan. Las respuestas se entregan en orden.
+    """
+
+    def __init__(self, s, window, max_tries, loss):
+        self.sock = s
+        self.window = window
+        self.max_tries = max_tries
+        self.loss = loss
+        self.srtt = None
+        self.rttvar = 0.0
+        self.rto = 0.2
+        self.next_seq = 0
+        self.deliver_seq = 0  # siguiente respuesta a entregar, en orden
+        self.inflight = {}    # seq -> [payload, hora del primer envío, intentos]
+        self.done = {}        # seq -> eco (o None si se perdió), esperando su turno para entregar
+        self.timers = []      # heap de (vence, seq, intento)
+        self.rtts = []
+        self.sent = self.retransmits = self.duplicates = self.lost = 0
+
+    def _send(self, seq):
+        payload, first, tries = self.inflight[seq]
+        heapq.heappush(self.timers, (time.monotonic() + self.rto * 2**(tries-1), seq, tries))
+        if random.random() * 100 < self.loss: # pérdida simulada
+            return
+        try:
+            self.sock.send(SEQ.pack(seq) + payload)
+        except OSError:
+            pass # ICMP de un envío anterior (ej: servidor aún no está): el timer lo reintenta
+
+    def submit(self, payload):
+        seq = self.next_seq
+        self.next_seq += 1
+        self.inflight[seq] = [payload, time.monotonic(), 1]
+        self.sent += 1
+        self._send(seq)
+
+    def _update_rto(self, rtt):
+        if self.srtt is None:
+            self.srtt, self.rttvar = rtt, rtt/2
+        else:
+            self.rttvar = 0.75*self.rttvar + 0.25*abs(self.srtt - rtt)
+            self.srtt = 0.875*self.srtt + 0.125*rtt
+        self.rto = min(MAX_RTO, max(MIN_RTO, self.srtt + 4*self.rttvar))
+
+    def _expire(self): # dispara los timers vencidos
+        now = time.monotonic()
+        while self.timers and self.timers[0][0] <= now:
+            deadline, seq, tries = heapq.heappop(self.timers)
+            if seq not in self.inflight or self.inflight[seq][2] != tries:
+                continue # ya respondido, o es un timer viejo de un intento anterior
+            if tries >= self.max_tries:
+                del self.inflight[seq]
+                self.done[seq] = None
+                self.lost += 1
+                continue
+            self.inflight[seq][2] += 1
+            self.retransmits += 1
+            self._send(seq)
+
+    def _receive(self, timeout):
+        self.sock.settimeout(max(timeout, 0.0005))
+        try:
+            data = self.sock.recv(65536)
+        except OSError: # timeout o ICMP
+            return
+        if random.random() * 100 < self.loss or len(data) < SEQ.size:
+            return
+        seq, = SEQ.unpack_from(data)
+        entry = self.inflight.pop(seq, None)
+        if entry is None:
+            self.duplicates += 1
+            return
+        rtt = time.monotonic() - entry[1]
+        self.rtts.append(rtt)
+        if entry[2] == 1: # Karn: sólo muestras sin retransmisión ajustan el RTO
+            self._update_rto(rtt)
+        self.done[seq] = data[SEQ.size:]
+
+    def poll(self, timeout): # retorna las respuestas que ya se pueden entregar, en orden
+        if self.timers:
+            timeout = min(timeout, self.timers[0][0] - time.monotonic())
+        self._receive(timeout)
+        self._expire()
+        out = []
+        while self.deliver_seq in self.done:
+            out.append(self.done.pop(self.deliver_seq))
+            self.deliver_seq += 1
+        return out
+
+    def idle(self):
+        return not self.inflight
+
+    def stats(self, elapsed):
+        rtts = sorted(self.rtts)
+        pct = lambda p: 1000*rtts[min(len(rtts)-1, int(p/100*len(rtts)))] if rtts else float('nan')
+        return (f'{self.sent} pedidos, {len(rtts)} respondidos, {self.lost} perdidos, '
+                f'{self.retransmits} retransmisiones, {self.duplicates} duplicados, '
+                f'{len(rtts)/elapsed:.0f} ecos/s, RTT p50 {pct(50):.2f} ms, p99 {pct(99):.2f} ms, RTO final {1000*self.rto:.0f} ms')
+
+def reliable(s, args):
+    rel = ReliableEcho(s, args.window, args.tries, args.loss)
+    # el primer pedido también es confiable: le da tiempo al server para conectar el socket
+    rel.submit(b'hola')
+    while not rel.idle():
+        rel.poll(1.0)
+    if rel.lost:
+        print('server does not answer')
+        sys.exit(1)
+    rel.deliver_seq = rel.next_seq
+    rel.rtts.clear()
+    rel.sent = rel.retransmits = rel.duplicates = 0
 
-s = jsockets.socket_udp_connect(sys.argv[1], sys.argv[2])
+    if args.n > 0: # benchmark: n pedidos sintéticos
+        q = queue.Queue()
+        for i in range(args.n):
+            q.put(b'x'*args.size)
+        q.put(None)
+        show = False
+    else:
+        q = queue.Queue()
+        threading.Thread(target=stdin_reader, args=(q,), daemon=True).start()
+        show = True
+
+    start = time.time()
+    eof = False
+    while not eof or not rel.idle():
+        while not eof and len(rel.inflight) < rel.window:
+            try:
+                payload = q.get_nowait() if not rel.idle() else q.get(timeout=0.05)
+            except queue.Empty:
+                break
+            if payload is None:
+                eof = True
+                break
+            rel.submit(payload)
+        for data in rel.poll(0.05):
+            if show and data is not None:
+                print(data.decode(), end = '')
+    print(rel.stats(time.time() - start), file=sys.stderr)
+
+parser = argparse.ArgumentParser(description='Echo client UDP')
+parser.add_argument('host')
+parser.add_argument('port')
+parser.add_argument('--reliable', action='store_true', help='pedidos numerados con retransmisión')
+parser.add_argument('-w', '--window', type=int, default=32, help='reliable: pedidos en vuelo')
+parser.add_argument('--tries', type=int, default=8, help='reliable: intentos antes de dar un pedido por perdido')
+parser.add_argument('--loss', type=float, default=0.0, help='reliable: porcentaje de pérdida simulada en cada sentido')
+parser.add_argument('-n', type=int, default=0, help='reliable: benchmark con n pedidos en vez de stdin')
+parser.add_argument('-s', '--size', type=int, default=32, help='reliable: tamaño de los pedidos del benchmark')
+args = parser.parse_args()
+
+s = jsockets.socket_udp_connect(args.host, args.port)
 if s is None:
     print('could not open socket')
     sys.exit(1)
 
+if args.reliable:
+    reliable(s, args)
+    s.close()
+    sys.exit(0)
+
 # Esto es para dejar tiempo al server para conectar el socket
 s.send(b'hola')
-s.recv(1024)
+s.recv(jsockets.BUFSIZE)
 
 # Creo thread que lee desde el socket hacia stdout:
 newthread = threading.Thread(target=Rdr, args=(s,))
@@ -41,4 +207,3 @@ for line in sys.stdin:
 
 time.sleep(3)  # dar tiempo para que vuelva la respuesta
 s.close()
-
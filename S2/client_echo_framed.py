@@ -0,0 +1,97 @@
+#!/usr/bin/python3
+# Echo client program - version con mensajes con largo (jsockets.framing)
+# Cada línea se manda como un mensaje y no se espera la respuesta para mandar la siguiente:
+# el decoder separa las respuestas aunque lleguen juntas o partidas.
+# Los servidores de eco TCP devuelven los bytes tal cual, así que sirve con cualquiera de ellos
+# Con -n hace un benchmark: n mensajes, manteniendo hasta depth en vuelo
+import jsockets
+import sys, threading, socket
+import time, argparse, selectors
+
+def Rdr(s, decoder, state, lock):
+    while True:
+        try:
+            msgs = jsockets.recv_msgs(s, decoder)
+        except (OSError, ValueError):
+            msgs = None
+        if msgs is None:
+            break
+        for m in msgs:
+            print(m.decode(), end = '')
+        with lock:
+            state['received'] += len(msgs)
+            if state['expected'] is not None and state['received'] >= state['expected']:
+                break
+
+def interactive(s):
+    decoder = jsockets.FrameDecoder()
+    lock = threading.Lock()
+    state = {'received': 0, 'expected': None} # compartido con Rdr, siempre con lock
+    newthread = threading.Thread(target=Rdr, args=(s, decoder, state, lock))
+    newthread.start()
+    sent = 0
+    for line in sys.stdin:
+        jsockets.send_msg(s, line.encode())
+        sent += 1
+    with lock:
+        state['expected'] = sent # ya no espero 3 segundos: sé cuántas respuestas faltan
+        if state['received'] >= sent:
+            # ya llegaron todas y Rdr está bloqueado en recv: lo despierto
+            s.shutdown(socket.SHUT_RD)
+    newthread.join()
+
+# Los envíos no bloquean (como en loadgen_echo.py): si depth*size no cabe en los buffers, un sendall
+# bloquearía al cliente mientras el servidor se bloquea devolviendo ecos que nadie lee
+def bench(s, n, depth, size):
+    decoder = jsockets.FrameDecoder()
+    msg = jsockets.framing.frame(b'x'*size)
+    out = bytearray()
+    sent = received = 0
+    s.setblocking(False)
+    sel = selectors.DefaultSelector()
+    sel.register(s, selectors.EVENT_READ)
+    start = time.time()
+    while received < n:
+        k = min(depth - (sent - received), n - sent)
+        if k > 0:
+            out += msg*k # todos los que caben en la ventana
+            sent += k
+        if out:
+            try:
+                del out[:s.send(out)]
+            except BlockingIOError:
+                pass
+        sel.modify(s, selectors.EVENT_READ | (selectors.EVENT_WRITE if out else 0))
+        events = sel.select()
+        if not any(mask & selectors.EVENT_READ for key, mask in events):
+            continue
+        try:
+            data = s.recv(64*1024)
+        except BlockingIOError:
+            continue
+        if not data:
+            print('server closed the connection')
+            break
+        received += len(decoder.feed(data))
+    sel.close()
+    elapsed = time.time() - start
+    print(f'{received} mensajes de {size} bytes, depth {depth}: {received/elapsed:.0f} req/s')
+
+parser = argparse.ArgumentParser(description='Echo client con mensajes con largo')
+parser.add_argument('host')
+parser.add_argument('port')
+parser.add_argument('-n', type=int, default=0, help='benchmark: cantidad de mensajes (0: leer de stdin)')
+parser.add_argument('-d', '--depth', type=int, default=64, help='benchmark: mensajes en vuelo')
+parser.add_argument('-s', '--size', type=int, default=32, help='benchmark: tamaño de cada mensaje')
+args = parser.parse_args()
+
+s = jsockets.socket_tcp_connect(args.host, args.port, nodelay=1)
+if s is None:
+    print('could not open socket')
+    sys.exit(1)
+
+if args.n > 0:
+    bench(s, args.n, max(1, args.depth), args.size)
+else:
+    interactive(s)
+s.close()
@@ -0,0 +1,195 @@
+#!/usr/bin/python3
+# Generador de carga para los servidores de eco TCP
+# Abre muchas conexiones y en cada una mantiene depth mensajes en vuelo (jsockets.framing),
+# cada mensaje lleva la hora en que salió, así que al volver el eco se tiene su RTT.
+# Un solo thread con selectors, para que el cliente no sea el cuello de botella.
+# Reporta req/s, MB/s y los percentiles p50/p90/p99/p999 del RTT
+import jsockets
+import time, struct, socket
+import selectors, argparse
+
+STAMP = struct.Struct('!Q') # perf_counter_ns al momento de enviar
+
+class Conn:
+    def __init__(self, sock):
+        self.sock = sock
+        self.decoder = jsockets.FrameDecoder()
+        self.out = bytearray()
+        self.inflight = 0
+        self.echoes = 0
+
+def percentile(values, p): # values ordenados
+    if not values:
+        return float('nan')
+    return values[min(len(values)-1, int(p/100*len(values)))]
+
+def _fill(c, depth, padding):
+    k = depth - c.inflight
+    if k <= 0:
+        return
+    now = STAMP.pack(time.perf_counter_ns())
+    c.out += jsockets.framing.frame(now + padding) * k
+    c.inflight += k
+
+# Retorna False si la conexión se cayó (reset, pipe roto): el que llama la cuenta como error y la bota
+def _flush(sel, c):
+    try:
+        n = c.sock.send(c.out)
+    except (BlockingIOError, InterruptedError):
+        n = 0
+    except OSError:
+        return False
+    del c.out[:n]
+    sel.modify(c.sock, selectors.EVENT_READ | (selectors.EVENT_WRITE if c.out else 0), c)
+    return True
+
+def _drop(sel, c, open_conns):
+    sel.unregister(c.sock)
+    c.sock.close()
+    open_conns.remove(c)
+
+# Conecta todas las conexiones en paralelo: si el servidor no alcanza a aceptarlas (cola del listen llena)
+# cada connect se quedaría esperando reintentos de SYN. Las que no conectan en timeout quedan en None
+def _connect_all(host, port, conns, timeout=2.0):
+    first = jsockets.socket_tcp_connect(host, port, nodelay=1, timeout=timeout)
+    if first is None:
+        return [None]*conns
+    first.setblocking(False)
+    peer = first.getpeername() # la dirección que sí funcionó, para no probar todas de nuevo
+    sel = selectors.DefaultSelector()
+    for i in range(conns - 1):
+        s = socket.socket(first.family, socket.SOCK_STREAM)
+        jsockets.set_options(s, nodelay=1)
+        s.setblocking(False)
+        s.connect_ex(peer)
+        sel.register(s, selectors.EVENT_WRITE)
+    result = [first]
+    deadline = time.perf_counter() + timeout
+    while sel.get_map() and time.perf_counter() < deadline:
+        for key, mask in sel.select(timeout=deadline - time.perf_counter()):
+            s = key.fileobj
+            sel.unregister(s)
+            if s.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+                result.append(s)
+            else:
+                s.close()
+    for key in list(sel.get_map().values()):
+        key.fileobj.close()
+    sel.close()
+    return result + [None]*(conns - len(result))
+
+def run(host, port, conns=10, depth=1, size=64, duration=5.0):
+    size = max(size, STAMP.size)
+    padding = b'x'*(size - STAMP.size)
+    sel = selectors.DefaultSelector()
+    errors = 0
+    open_conns = []
+    for s in _connect_all(host, port, conns):
+        if s is None:
+            errors += 1
+            continue
+        c = Conn(s)
+        open_conns.append(c)
+        sel.register(s, selectors.EVENT_READ, c)
+
+    rtts = []
+    nbytes = 0
+    start = time.perf_counter()
+    end = start + duration
+    for c in list(open_conns):
+        _fill(c, depth, padding)
+        if not _flush(sel, c):
+            errors += 1
+            _drop(sel, c, open_conns)
+
+    while open_conns and time.perf_counter() < end:
+        for key, mask in sel.select(timeout=0.1):
+            c = key.data
+            if mask & selectors.EVENT_READ:
+                try:
+                    data = c.sock.recv(64*1024)
+                except (BlockingIOError, InterruptedError):
+                    data = None
+                except OSError:
+                    data = b''
+                if data == b'': # el servidor cerró (o rechazó) la conexión
+                    errors += 1
+                    _drop(sel, c, open_conns)
+                    continue
+                if data:
+                    now = time.perf_counter_ns()
+                    for m in c.decoder.feed(data):
+                        rtts.append(now - STAMP.unpack_from(m)[0])
+                        nbytes += len(m)
+                        c.inflight -= 1
+                        c.echoes += 1
+                    _fill(c, depth, padding)
+            if c.out and not _flush(sel, c):
+                errors += 1
+                _drop(sel, c, open_conns)
+    elapsed = time.perf_counter() - start
+    # conectadas pero sin ningún eco en toda la medición: p.ej. esperando en la cola del listen
+    # de un servidor iterativo. No son errores, pero tampoco fueron atendidas
+    stalled = sum(1 for c in open_conns if c.echoes == 0)
+
+    # cierre ordenado: dejo de escribir y leo lo que falta hasta el EOF del servidor,
+    # si cerrara con datos sin leer el kernel mandaría un RST y el servidor lo vería como error
+    for c in open_conns:
+        try:
+            c.sock.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+    drain_end = time.perf_counter() + 1.0
+    while open_conns and time.perf_counter() < drain_end:
+        for key, mask in sel.select(timeout=0.1):
+            c = key.data
+            try:
+                data = c.sock.recv(64*1024)
+            except (BlockingIOError, InterruptedError):
+                continue
+            except OSError:
+                data = b''
+            if not data:
+                _drop(sel, c, open_conns)
+    for c in open_conns:
+        sel.unregister(c.sock)
+        c.sock.close()
+    sel.close()
+    rtts.sort()
+    return {
+        'conns': conns - errors if errors < conns else 0,
+        'msgs': len(rtts),
+        'req/s': len(rtts)/elapsed,
+        'MB/s': nbytes/elapsed/1024/1024,
+        'p50': percentile(rtts, 50)/1000,
+        'p90': percentile(rtts, 90)/1000,
+        'p99': percentile(rtts, 99)/1000,
+        'p999': percentile(rtts, 99.9)/1000,
+        'errors': errors,
+        'stalled': stalled,
+    }
+
+HEADER = f'{"conns":>6} {"depth":>6} {"size":>6} {"req/s":>10} {"MB/s":>8} {"p50 us":>9} {"p90 us":>9} {"p99 us":>9} {"p999 us":>9} {"errors":>6} {"stall":>5}'
+
+def report(r, depth, size):
+    return (f'{r["conns"]:>6} {depth:>6} {size:>6} {r["req/s"]:>10.0f} {r["MB/s"]:>8.2f} '
+            f'{r["p50"]:>9.0f} {r["p90"]:>9.0f} {r["p99"]:>9.0f} {r["p999"]:>9.0f} {r["errors"]:>6} {r["stalled"]:>5}')
+
+def main():
+    parser = argparse.ArgumentParser(description='Generador de carga para servidores de eco TCP')
+    parser.add_argument('host')
+    parser.add_argument('port')
+    parser.add_argument('-c', '--conns', type=int, default=10, help='conexiones simultáneas')
+    parser.add_argument('-d', '--depth', type=int, default=1, help='mensajes en vuelo por conexión')
+    parser.add_argument('-s', '--size', type=int, default=64, help='tamaño de cada mensaje (mínimo 8)')
+    parser.add_argument('-t', '--time', type=float, default=5.0, help='duración en segundos')
+    args = parser.parse_args()
+    if args.conns < 1 or args.depth < 1 or args.time <= 0:
+        parser.error('conns, depth y time deben ser mayores que 0')
+
+    r = run(args.host, args.port, args.conns, args.depth, args.size, args.time)
+    print(HEADER)
+    print(report(r, args.depth, args.size))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,429 @@
+#!/usr/bin/python3
+# Emulador de red en espacio de usuario: un proxy que se pone entre un cliente y un servidor
+# (UDP o TCP) y aplica a cada sentido: retardo con jitter (uniforme, normal o pareto), pérdida,
+# duplicación, reordenamiento y un enlace de capacidad limitada con su cola (drop-tail).
+# Un solo thread con selectors; los paquetes en espera van a una rueda de timers (timer wheel)
+# con un heap de los ticks ocupados al lado: agendar y despachar son O(log n) en los ticks ocupados,
+# y lo que ya venció (sin retardo) sale en la misma vuelta, sin esperar al select
+# Cada opción acepta uno o dos valores: uno para ambos sentidos, o cliente->servidor servidor->cliente
+# Uso: netem.py [--tcp] listen_port server server_port [--delay ms] [--jitter ms] [--loss %] ...
+# En TCP sólo aplican delay, jitter (sin desordenar el stream) y rate; la cola la pone --tcp-buffer
+# Ej:  ./netem.py 1819 localhost 1818 --delay 20 --jitter 5 --loss 1 --rate 10
+#      ./client_echo3_udp.py localhost 1819 --reliable
+import jsockets
+import sys, time, random, socket, heapq, errno
+import selectors, argparse, signal
+
+TICK = 0.0005    # resolución de la rueda, en segundos
+SLOTS = 4096     # la rueda cubre SLOTS*TICK segundos, más lejos da vueltas
+FLOW_IDLE = 60   # UDP: segundos sin tráfico para olvidar un cliente
+TCP_CHUNK = 65536
+CONNECT_TIMEOUT = 5.0 # TCP: segundos para conectar con el servidor, por dirección
+
+class TimerWheel:
+    def __init__(self, tick=TICK, slots=SLOTS):
+        self.tick = tick
+        self.slots = [[] for i in range(slots)]
+        self.current = int(time.monotonic() / tick) # último tick ya despachado
+        self.ticks = []       # heap con los ticks ocupados: el próximo sin recorrer la rueda
+        self.occupied = set() # los mismos, para no repetirlos en el heap
+        self.due = []         # eventos que ya vencieron al agendarlos: salen en el próximo expire
+        self.count = 0
+
+    def schedule(self, when, event):
+        self.count += 1
+        t = int(when / self.tick)
+        if t <= self.current: # sin retardo: no espero al próximo tick
+            self.due.append(event)
+            return
+        self.slots[t % len(self.slots)].append((t, event))
+        if t not in self.occupied:
+            self.occupied.add(t)
+            heapq.heappush(self.ticks, t)
+
+    def expire(self, now): # eventos vencidos, en orden de tick
+        # los de due vencieron antes que cualquiera de la rueda (tick <= current)
+        out, self.due = self.due, []
+        last = int(now / self.tick)
+        while self.ticks and self.ticks[0] <= last:
+            t = heapq.heappop(self.ticks)
+            self.occupied.discard(t)
+            i = t % len(self.slots)
+            keep = []
+            for entry in self.slots[i]:
+                if entry[0] == t:
+                    out.append(entry[1])
+                else:
+                    keep.append(entry) # de una vuelta posterior
+            self.slots[i] = keep
+        self.current = max(self.current, last)
+        self.count -= len(out)
+        return out
+
+    def next_timeout(self): # segundos hasta el próximo tick ocupado (None si está vacía)
+        if self.due:
+            return 0
+        if not self.ticks:
+            return None
+        return max(0.0, self.ticks[0] * self.tick - time.monotonic())
+
+class Link: # un sentido: capacidad, cola, retardo y las alteraciones
+    def __init__(self, name, delay, jitter, dist, loss, dup, reorder, rate, limit):
+        self.name = name
+        self.delay = delay / 1000
+        self.jitter = jitter / 1000
+        self.dist = dist
+        self.loss = loss
+        self.dup = dup
+        self.reorder = reorder
+        self.rate = rate * 1e6 / 8 # Mbit/s -> bytes/s, 0: infinito
+        self.limit = limit         # paquetes en la cola del enlace
+        self.busy_until = 0.0
+        self.queue = []            # horas de salida de los paquetes en la cola
+        self.last_delivery = 0.0   # TCP: el stream no se puede desordenar
+        self.stats = dict.fromkeys(['in', 'lost', 'queue_drop', 'dup', 'reordered', 'out'], 0)
+
+    def _delay(self):
+        if self.jitter == 0:
+            return self.delay
+        if self.dist == 'normal':
+            d = random.gauss(self.delay, self.jitter)
+        elif self.dist == 'pareto': # cola larga: casi todos cerca de delay, algunos muy lejos
+            d = self.delay + self.jitter * (random.paretovariate(3) - 1)
+        else:
+            d = self.delay + random.uniform(-self.jitter, self.jitter)
+        return max(0.0, d)
+
+    def _depart(self, now, size): # hora de salida del enlace, None si la cola está llena
+        while self.queue and self.queue[0] <= now:
+            self.queue.pop(0)
+        if not self.rate:
+            return now
+        if len(self.queue) >= self.limit:
+            return None
+        self.busy_until = max(now, self.busy_until) + size / self.rate
+        self.queue.append(self.busy_until)
+        return self.busy_until
+
+    def datagram(self, now, size): # horas de entrega de un datagrama (vacía: se perdió)
+        self.stats['in'] += 1
+        if self.loss and random.random() * 100 < self.loss:
+            self.stats['lost'] += 1
+            return []
+        depart = self._depart(now, size)
+        if depart is None:
+            self.stats['queue_drop'] += 1
+            return []
+        if self.reorder and random.random() * 100 < self.reorder: # sale sin retardo: se adelanta a los que esperan
+            self.stats['reordered'] += 1
+            times = [depart]
+        else:
+            times = [depart + self._delay()]
+        if self.dup and random.random() * 100 < self.dup:
+            self.stats['dup'] += 1
+            times.append(depart + self._delay())
+        return times
+
+    def stream(self, now, size): # TCP: hora de entrega de un pedazo, sin desordenar
+        self.stats['in'] += 1
+        self.busy_until = max(now, self.busy_until) + (size / self.rate if self.rate else 0)
+        self.last_delivery = max(self.last_delivery, self.busy_until + self._delay())
+        return self.last_delivery
+
+    def report(self):
+        return f'{self.name}: ' + ', '.join(f'{k} {v}' for k, v in self.stats.items())
+
+# --- UDP ---
+
+class UdpProxy:
+    def __init__(self, args, links):
+        self.args = args
+        self.up, self.down = links
+        self.sel = selectors.DefaultSelector()
+        self.wheel = TimerWheel()
+        self.listen = jsockets.socket_udp_bind(args.listen_port)
+        if self.listen is None:
+            print('could not open socket')
+            sys.exit(1)
+        self.listen.setblocking(False)
+        self.sel.register(self.listen, selectors.EVENT_READ, None)
+        self.flows = {} # dirección del cliente -> [socket hacia el servidor, último uso]
+
+    def _flow(self, addr, now):
+        if addr not in self.flows:
+            s = jsockets.socket_udp_connect(self.args.server, self.args.server_port)
+            if s is None:
+                return None
+            s.setblocking(False)
+            self.sel.register(s, selectors.EVENT_READ, addr)
+            self.flows[addr] = [s, now]
+        self.flows[addr][1] = now
+        return self.flows[addr][0]
+
+    def _expire_flows(self, now):
+        for addr in [a for a, (s, last) in self.flows.items() if now - last > FLOW_IDLE]:
+            s = self.flows.pop(addr)[0]
+            self.sel.unregister(s)
+            s.close()
+
+    def _deliver(self, event):
+        sock, data, addr = event
+        try:
+            if addr is None:
+                sock.send(data)
+            else:
+                sock.sendto(data, addr)
+        except OSError:
+            return # buffer lleno o ICMP: como en la red, el datagrama se pierde
+        (self.up if addr is None else self.down).stats['out'] += 1
+
+    def run(self):
+        last_gc = time.monotonic()
+        while True:
+            for key, mask in self.sel.select(self.wheel.next_timeout()):
+                now = time.monotonic()
+                while True: # vacío el socket: muchos datagramas por cada select
+                    try:
+                        data, addr = key.fileobj.recvfrom(65536)
+                    except OSError:
+                        break
+                    if key.data is None: # del cliente hacia el servidor
+                        s = self._flow(addr, now)
+                        if s is None:
+                            continue
+                        event, link = (s, data, None), self.up
+                    else:
+                        event, link = (self.listen, data, key.data), self.down
+                        self.flows[key.data][1] = now
+                    for when in link.datagram(now, len(data)):
+                        self.wheel.schedule(when, event)
+            now = time.monotonic()
+            for event in self.wheel.expire(now):
+                self._deliver(event)
+            if now - last_gc > FLOW_IDLE / 4:
+                self._expire_flows(now)
+                last_gc = now
+
+# --- TCP ---
+
+class TcpPipe: # un sentido de una conexión: lo leído de src se escribe en dst al momento agendado
+    def __init__(self, src, dst, link):
+        self.src, self.dst, self.link = src, dst, link
+        self.out = bytearray()
+        self.scheduled = 0    # bytes en la rueda todavía
+        self.eof = False
+        self.closed = False
+
+class TcpProxy:
+    def __init__(self, args, links):
+        self.args = args
+        self.up, self.down = links
+        self.sel = selectors.DefaultSelector()
+        self.wheel = TimerWheel()
+        self.listen = jsockets.socket_tcp_bind(args.listen_port, backlog=128)
+        if self.listen is None:
+            print('could not open socket')
+            sys.exit(1)
+        self.listen.setblocking(False)
+        self.sel.register(self.listen, selectors.EVENT_READ, None)
+        self.interest = {} # socket -> [pipe que lee de él, pipe que escribe en él]
+        self.connecting = {} # socket hacia el servidor -> [cliente, direcciones que faltan, hora límite]
+
+    def _update(self, s):
+        reader, writer = self.interest[s]
+        # si hay mucho pendiente dejo de leer: el control de flujo de TCP frena al que envía
+        events = 0
+        if not reader.eof and reader.scheduled + len(reader.out) < self.args.tcp_buffer:
+            events |= selectors.EVENT_READ
+        if writer.out:
+            events |= selectors.EVENT_WRITE
+        key = self.sel.get_key(s) if s in self.sel.get_map() else None
+        if key is None:
+            if events:
+                self.sel.register(s, events)
+        elif events == 0:
+            self.sel.unregister(s)
+        elif key.events != events:
+            self.sel.modify(s, events)
+
+    def _accept(self):
+        try:
+            conn, addr = self.listen.accept()
+        except OSError:
+            return
+        try:
+            addrs = jsockets.getaddrinfo(self.args.server, self.args.server_port, socket.AF_UNSPEC, socket.SOCK_STREAM)
+        except OSError:
+            conn.close()
+            return
+        self._connect(conn, list(addrs))
+
+    # connect sin bloquear: mientras tanto el loop sigue moviendo los demás flujos y la rueda.
+    # Cuando el socket queda escribible _connected ve si resultó; si no, se prueba la dirección siguiente
+    def _connect(self, conn, addrs):
+        while addrs:
+            af, socktype, proto, canonname, sa = addrs.pop(0)
+            try:
+                s = socket.socket(af, socktype, proto)
+            except OSError:
+                continue
+            s.setblocking(False)
+            if s.connect_ex(sa) in (0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN):
+                self.connecting[s] = [conn, addrs, time.monotonic() + CONNECT_TIMEOUT]
+                self.sel.register(s, selectors.EVENT_WRITE)
+                return
+            s.close()
+        conn.close() # ninguna dirección del servidor contestó
+
+    def _expire_connects(self, now):
+        for s in [s for s, (conn, addrs, deadline) in self.connecting.items() if deadline <= now]:
+            conn, addrs, deadline = self.connecting.pop(s)
+            self.sel.unregister(s)
+            s.close()
+            self._connect(conn, addrs)
+
+    def _connected(self, server):
+        conn, addrs, deadline = self.connecting.pop(server)
+        self.sel.unregister(server)
+        if server.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) != 0:
+            server.close()
+            self._connect(conn, addrs)
+            return
+        for s in (conn, server):
+            s.setblocking(False)
+            s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        up = TcpPipe(conn, server, self.up)
+        down = TcpPipe(server, conn, self.down)
+        self.interest[conn] = [up, down]
+        self.interest[server] = [down, up]
+        self._update(conn)
+        self._update(server)
+
+    def _close(self, pipe):
+        for s in (pipe.src, pipe.dst):
+            if s in self.interest:
+                if s in self.sel.get_map():
+                    self.sel.unregister(s)
+                del self.interest[s]
+                s.close()
+
+    def _read(self, pipe):
+        try:
+            data = pipe.src.recv(TCP_CHUNK)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+        now = time.monotonic()
+        pipe.scheduled += len(data)
+        self.wheel.schedule(pipe.link.stream(now, len(data)), (pipe, data))
+        if not data:
+            pipe.eof = True
+        self._update(pipe.src)
+
+    def _write(self, pipe):
+        try:
+            n = pipe.dst.send(pipe.out)
+        except BlockingIOError:
+            n = 0
+        except OSError:
+            self._close(pipe)
+            return
+        del pipe.out[:n]
+        if not pipe.out and pipe.closed:
+            try:
+                pipe.dst.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+        if pipe.dst in self.interest:
+            self._update(pipe.dst)
+
+    def _deliver(self, event):
+        pipe, data = event
+        if pipe.dst not in self.interest:
+            return
+        pipe.scheduled -= len(data)
+        if data:
+            pipe.out += data
+            pipe.link.stats['out'] += 1
+        else:
+            pipe.closed = True # EOF: después de lo que queda en out
+        self._write(pipe)
+        if pipe.src in self.interest:
+            self._update(pipe.src)
+        other = self.interest.get(pipe.dst, [None])[0]
+        if pipe.closed and not pipe.out and other is not None and other.closed and not other.out:
+            self._close(pipe)
+
+    def _timeout(self): # hasta el próximo timer o el próximo connect que vence
+        timeout = self.wheel.next_timeout()
+        if self.connecting:
+            wait = max(0.0, min(d for c, a, d in self.connecting.values()) - time.monotonic())
+            timeout = wait if timeout is None else min(timeout, wait)
+        return timeout
+
+    def run(self):
+        while True:
+            for key, mask in self.sel.select(self._timeout()):
+                if key.fileobj is self.listen:
+                    self._accept()
+                    continue
+                if key.fileobj in self.connecting:
+                    self._connected(key.fileobj)
+                    continue
+                if key.fileobj not in self.interest:
+                    continue
+                reader, writer = self.interest[key.fileobj]
+                if mask & selectors.EVENT_WRITE:
+                    self._write(writer)
+                if mask & selectors.EVENT_READ and key.fileobj in self.interest:
+                    self._read(reader)
+            now = time.monotonic()
+            for event in self.wheel.expire(now):
+                self._deliver(event)
+            if self.connecting:
+                self._expire_connects(now)
+
+def both(name, values): # uno o dos valores: (cliente->servidor, servidor->cliente)
+    if len(values) > 2:
+        sys.exit(f'--{name}: one or two values')
+    return (values[0], values[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description='Emulador de red: proxy UDP/TCP con retardo, pérdida y capacidad')
+    parser.add_argument('listen_port', type=int)
+    parser.add_argument('server')
+    parser.add_argument('server_port', type=int)
+    parser.add_argument('--tcp', action='store_true', help='proxy TCP (por omisión UDP)')
+    parser.add_argument('--delay', type=float, nargs='+', default=[0], help='ms de retardo')
+    parser.add_argument('--jitter', type=float, nargs='+', default=[0], help='ms de variación del retardo')
+    parser.add_argument('--dist', choices=['uniform', 'normal', 'pareto'], default='uniform', help='distribución del jitter')
+    parser.add_argument('--loss', type=float, nargs='+', default=[0], help='UDP: %% de pérdida')
+    parser.add_argument('--dup', type=float, nargs='+', default=[0], help='UDP: %% de duplicados')
+    parser.add_argument('--reorder', type=float, nargs='+', default=[0], help='UDP: %% de paquetes que salen sin retardo')
+    parser.add_argument('--rate', type=float, nargs='+', default=[0], help='Mbit/s del enlace (0: sin límite)')
+    parser.add_argument('--limit', type=int, nargs='+', default=[100], help='UDP: paquetes en la cola del enlace')
+    parser.add_argument('--tcp-buffer', type=int, default=1 << 20, help='TCP: bytes en tránsito antes de dejar de leer')
+    parser.add_argument('--seed', type=int, default=None, help='semilla, para repetir un experimento')
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    opts = {name: both(name, getattr(args, name)) for name in ['delay', 'jitter', 'loss', 'dup', 'reorder', 'rate', 'limit']}
+    links = [Link(name, *[opts[o][i] for o in ['delay', 'jitter']], args.dist,
+                  *[opts[o][i] for o in ['loss', 'dup', 'reorder', 'rate', 'limit']])
+             for i, name in enumerate(['cliente->servidor', 'servidor->cliente'])]
+    proxy = TcpProxy(args, links) if args.tcp else UdpProxy(args, links)
+
+    def report(sig, frame):
+        for link in links:
+            print(link.report(), file=sys.stderr)
+        if sig == signal.SIGINT or sig == signal.SIGTERM:
+            sys.exit(0)
+    signal.signal(signal.SIGINT, report)
+    signal.signal(signal.SIGTERM, report)
+    signal.signal(signal.SIGUSR1, report) # kill -USR1: muestra los contadores sin terminar
+    print(f'{"TCP" if args.tcp else "UDP"} {args.listen_port} -> {args.server}:{args.server_port}', file=sys.stderr)
+    proxy.run()
+
+if __name__ == '__main__':
+    main()
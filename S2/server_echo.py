@@ -1,6 +1,7 @@
 #!/usr/bin/python3
 # Echo server program - version of server_echo.c
 import jsockets
+import sys
 
 s = jsockets.socket_tcp_bind(1818)
 if s is None:
@@ -9,9 +10,10 @@ if s is None:
 while True:
     conn, addr = s.accept();
     print('Connected by', addr)
+    rd = jsockets.Reader(conn, adaptive=True)
     while True:
-        data = conn.recv(1024)
+        data = rd.recv()
         if not data: break
-        conn.send(data)
+        conn.sendall(data)
     conn.close()
     print('Client disconnected')
@@ -14,10 +14,11 @@ def childdeath(signum, frame): # administro muerte de cada hijo
   chld_cnt -= 1
 
 def server(conn):
+    rd = jsockets.Reader(conn, adaptive=True)
     while True:
-        data = conn.recv(1024)
+        data = rd.recv()
         if not data: break
-        conn.send(data)
+        conn.sendall(data)
     conn.close()
     print('Cliente desconectado')
     sys.exit(0)
@@ -10,10 +10,11 @@ def childdeath(signum, frame):
 
 def server(conn):
     print('Cliente conectado')
+    rd = jsockets.Reader(conn, adaptive=True)
     while True:
-        data = conn.recv(1024)
+        data = rd.recv()
         if not data: break
-        conn.send(data)
+        conn.sendall(data)
     conn.close()
     print('Cliente desconectado')
     sys.exit(0)
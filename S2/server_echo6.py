@@ -16,6 +16,7 @@ Sock.setblocking(0) # es necesario para que no se bloquee en una escritura si el
 inputs = [Sock]
 outputs = []
 pending_data = {}
+readers = {}
 
 while inputs:
     readable,writable,exceptional = select.select(inputs,outputs,inputs)
@@ -28,27 +29,33 @@ while inputs:
             conn, addr = s.accept()
             print(f'Cliente conectado desde {addr}')
             inputs.append(conn)
+            readers[conn] = jsockets.Reader(conn, adaptive=True)
         else: # leo datos del socket
-            data = s.recv(1024)
+            data = readers[s].recv()
             if not data: # EOF, cliente se desconectó
                 print('Cliente desconectado')
                 inputs.remove(s)
+                del readers[s]
                 s.close()
             else: # Hago eco como debe ser
                 try:
-                    s.send(data)
+                    n = s.send(data)
                 except socket.error as e:
+                    n = 0
                     if e.errno != errno.EAGAIN:
                         inputs.remove(s)
-                    else:     # socket lleno, espero que se desocupe
-                        pending_data[s] = bytearray(data) # hacer una copia para después
-                        inputs.remove(s)
-                        outputs.append(s)
+                        continue
+                if n < len(data): # socket lleno, espero que se desocupe
+                    pending_data[s] = data[n:] # con lecturas grandes el send puede ser parcial
+                    inputs.remove(s)
+                    outputs.append(s)
     for s in writable: # sockets llenos que se desocuparon
         try:
-            s.send(pending_data[s])
+            n = s.send(pending_data[s])
         except:
             print('send failed')
-        pending_data[s] = bytearray()
-        outputs.remove(s)
-        inputs.append(s)
+            n = len(pending_data[s])
+        pending_data[s] = pending_data[s][n:]
+        if not pending_data[s]:
+            outputs.remove(s)
+            inputs.append(s)
@@ -0,0 +1,39 @@
+#!/usr/bin/python3
+# Echo server program - version con asyncio
+# Un solo proceso, una corrutina por cliente: escala a muchas conexiones con poca memoria
+# drain() hace el control de flujo: si el cliente no lee (bad_client), dejamos de leerle
+import asyncio
+import sys
+import jsockets
+
+BUFSIZE = 64*1024 # mucho más que 1024: menos llamadas al sistema por Mbyte
+
+async def echo(reader, writer):
+    print('Cliente conectado')
+    try:
+        while True:
+            data = await reader.read(BUFSIZE)
+            if not data: break
+            writer.write(data)
+            await writer.drain() # espero que se desocupe el buffer de salida
+    except ConnectionError:
+        pass
+    writer.close()
+    print('Cliente desconectado')
+
+async def main():
+    s = jsockets.socket_tcp_bind(1818)
+    if s is None:
+        print('could not open socket')
+        sys.exit(1)
+    server = await asyncio.start_server(echo, sock=s, limit=BUFSIZE)
+    async with server:
+        await server.serve_forever()
+
+if len(sys.argv) > 2:
+    print('Use: '+sys.argv[0]+' [bufsize]')
+    sys.exit(1)
+if len(sys.argv) == 2:
+    BUFSIZE = int(sys.argv[1])
+
+asyncio.run(main())
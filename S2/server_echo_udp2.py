@@ -28,7 +28,7 @@ class ClientThread(threading.Thread):
             self.sock.send(data)
             print(data)
             try:
-                data = self.sock.recv(1024)
+                data = self.sock.recv(jsockets.BUFSIZE)
             except:
                 data = None
             if not data: break
@@ -45,7 +45,7 @@ if s is None:
     sys.exit(1)
 while True:
     # Esta es la magia del REUSEPORT: espero un primer paquete
-    data, addr = s.recvfrom(1024)
+    data, addr = s.recvfrom(jsockets.BUFSIZE)
     if not data: break
     # Para este cliente, voy a crear otro socket en el mismo port
     conn = jsockets.socket_udp_bind(1818)
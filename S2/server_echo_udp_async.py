@@ -0,0 +1,31 @@
+#!/usr/bin/python3
+# Echo server UDP program - version con asyncio (DatagramProtocol)
+# Un solo socket y un solo proceso para todos los clientes, sin threads
+import asyncio
+import sys
+import jsockets
+
+class EchoProtocol(asyncio.DatagramProtocol):
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.transport.sendto(data, addr)
+
+    def error_received(self, exc):
+        print('error:', exc)
+
+async def main():
+    s = jsockets.socket_udp_bind(1818)
+    if s is None:
+        print('could not open socket')
+        sys.exit(1)
+    # para UDP el tamaño de lectura lo fija asyncio (64K), cabe cualquier datagrama
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(EchoProtocol, sock=s)
+    try:
+        await asyncio.Future() # para siempre
+    finally:
+        transport.close()
+
+asyncio.run(main())
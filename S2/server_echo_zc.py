@@ -0,0 +1,116 @@
+#!/usr/bin/python3
+# Echo server program - version zero-copy
+# Como server_echo6 (select), pero sin crear objetos nuevos en cada lectura:
+# cada cliente tiene un bytearray fijo, se lee con recv_into y se escribe con memoryview
+# En Linux (os.splice), el modo splice hace el eco completo en el kernel, pasando por un pipe,
+# y los datos nunca llegan a Python
+# Uso: server_echo_zc.py [copy|splice]
+import select
+import os
+import sys
+import jsockets
+
+BUFSIZE = 64*1024 # un pipe de Linux tiene 64K por defecto
+
+class Conn: # estado de un cliente
+    def __init__(self, sock, splice):
+        self.sock = sock
+        self.fd = sock.fileno()
+        self.pending = 0 # bytes leídos que no he podido devolver todavía
+        self.splice = splice
+        if splice:
+            self.pipe_r, self.pipe_w = os.pipe()
+        else:
+            self.buf = bytearray(BUFSIZE)
+            self.view = memoryview(self.buf)
+            self.start = 0
+
+    def read(self): # retorna False en EOF
+        try:
+            if self.splice:
+                n = os.splice(self.fd, self.pipe_w, BUFSIZE, flags=os.SPLICE_F_MOVE|os.SPLICE_F_NONBLOCK)
+            else:
+                n = self.sock.recv_into(self.view)
+                self.start = 0
+        except BlockingIOError: # select avisó pero no había nada, se reintenta en la próxima vuelta
+            return True
+        self.pending = n
+        return n > 0
+
+    def flush(self): # retorna True si se vació todo
+        try:
+            while self.pending > 0:
+                if self.splice:
+                    n = os.splice(self.pipe_r, self.fd, self.pending, flags=os.SPLICE_F_MOVE|os.SPLICE_F_NONBLOCK)
+                else:
+                    n = self.sock.send(self.view[self.start:self.start+self.pending])
+                    self.start += n
+                self.pending -= n
+        except BlockingIOError:
+            pass
+        return self.pending == 0
+
+    def close(self):
+        if self.splice:
+            os.close(self.pipe_r)
+            os.close(self.pipe_w)
+        else:
+            self.view.release()
+        self.sock.close()
+
+if len(sys.argv) > 2 or (len(sys.argv) == 2 and sys.argv[1] not in ('copy', 'splice')):
+    print('Use: '+sys.argv[0]+' [copy|splice]')
+    sys.exit(1)
+splice = hasattr(os, 'splice') and hasattr(os, 'SPLICE_F_MOVE')
+if len(sys.argv) == 2:
+    if sys.argv[1] == 'splice' and not splice:
+        print('os.splice no disponible, uso copy')
+    splice = splice and sys.argv[1] == 'splice'
+print('modo:', 'splice' if splice else 'copy')
+
+Sock = jsockets.socket_tcp_bind(1818)
+if Sock is None:
+    print('could not open socket')
+    sys.exit(1)
+Sock.setblocking(0)
+
+inputs = [Sock]
+outputs = []
+conns = {}
+
+def close(s):
+    print('Cliente desconectado')
+    if s in inputs: inputs.remove(s)
+    if s in outputs: outputs.remove(s)
+    conns.pop(s).close()
+
+while inputs:
+    readable,writable,exceptional = select.select(inputs,outputs,inputs)
+    for s in exceptional:
+        if s in conns: # el socket que escucha no es un cliente
+            close(s)
+    for s in readable:
+        if s is Sock:
+            conn, addr = s.accept()
+            conn.setblocking(0) # el socket aceptado no hereda el modo no bloqueante
+            print(f'Cliente conectado desde {addr}')
+            inputs.append(conn)
+            conns[conn] = Conn(conn, splice)
+        elif s in conns:
+            c = conns[s]
+            try:
+                if not c.read():
+                    close(s)
+                elif not c.flush(): # socket lleno, dejo de leer hasta que se desocupe
+                    inputs.remove(s)
+                    outputs.append(s)
+            except OSError:
+                close(s)
+    for s in writable:
+        if s not in conns: continue
+        try:
+            if conns[s].flush():
+                outputs.remove(s)
+                inputs.append(s)
+        except OSError:
+            close(s)
@@ -0,0 +1,221 @@
+# jsockets para Python3
+# Un solo paquete para todos los programas del curso (pip install -e . en la raíz del repo)
+# Lo básico (bind/connect/buffers/opciones) está aquí; el pool, multicast y happy eyeballs
+# viven en submódulos que se importan recién cuando se usan, para que import jsockets sea liviano
+import socket
+import sys
+import os
+import time
+import threading
+
+# Tamaños de buffer: se pueden cambiar sin tocar los programas con variables de ambiente
+# BUFSIZE es el tamaño de lectura de la aplicación (recv), RCVBUF/SNDBUF los del kernel (0: default del SO)
+BUFSIZE = int(os.environ.get('JSOCKETS_BUFSIZE', 4096))
+MAX_BUFSIZE = 1024*1024
+RCVBUF = int(os.environ.get('JSOCKETS_RCVBUF', 0))
+SNDBUF = int(os.environ.get('JSOCKETS_SNDBUF', 0))
+
+# Cache de getaddrinfo: conexiones repetidas al mismo server no le preguntan al DNS cada vez
+# las entradas duran ADDRINFO_TTL segundos (ttl=0 no guarda nada)
+ADDRINFO_TTL = 60.0
+_addrinfo_cache = {}
+_addrinfo_lock = threading.Lock()
+
+def getaddrinfo(host, port, family=0, type=0, proto=0, flags=0, ttl=None):
+    ttl = ADDRINFO_TTL if ttl is None else ttl
+    key = (host, str(port), family, type, proto, flags)
+    now = time.monotonic()
+    with _addrinfo_lock:
+        entry = _addrinfo_cache.get(key)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+    res = socket.getaddrinfo(host, port, family, type, proto, flags)
+    if ttl > 0:
+        with _addrinfo_lock:
+            _addrinfo_cache[key] = (now + ttl, res)
+    return res
+
+def flush_addrinfo():
+    with _addrinfo_lock:
+        _addrinfo_cache.clear()
+
+# accept no aporta nada en realidad...
+def accept(s):
+    return s.accept()
+
+# Lector con tamaño de lectura configurable
+# En modo adaptive, duplica el tamaño cada vez que una lectura vuelve llena (hasta max_size):
+# en transferencias grandes se llega rápido a pocas llamadas al sistema por Mbyte
+class Reader:
+    def __init__(self, s, size=None, adaptive=False, max_size=MAX_BUFSIZE):
+        self.sock = s
+        self.size = size or BUFSIZE
+        self.adaptive = adaptive
+        self.max_size = max(max_size, self.size)
+
+    def recv(self):
+        data = self.sock.recv(self.size)
+        if self.adaptive and len(data) == self.size and self.size < self.max_size:
+            self.size = min(2*self.size, self.max_size)
+        return data
+
+# hay que hacerlo antes del listen/connect para que el kernel negocie bien la ventana
+def set_buffers(s, rcvbuf=None, sndbuf=None):
+    rcvbuf = RCVBUF if rcvbuf is None else rcvbuf
+    sndbuf = SNDBUF if sndbuf is None else sndbuf
+    if rcvbuf > 0:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+    if sndbuf > 0:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, sndbuf)
+
+# Constantes de Linux que el módulo socket no siempre trae
+_LINUX = sys.platform.startswith('linux')
+def _const(name, linux_value):
+    return getattr(socket, name, linux_value if _LINUX else None)
+
+# Opciones de tuning que aceptan socket_bind/socket_connect como keywords (None: no tocar):
+#   nodelay=1       TCP_NODELAY, sin Nagle: mensajes chicos salen al tiro (clientes de eco)
+#   quickack=1      TCP_QUICKACK, ACKs sin retardo (Linux lo vuelve a apagar solo, es un hint)
+#   busy_poll=usecs SO_BUSY_POLL, el recv hace polling a la tarjeta en vez de dormir (Linux, puede pedir CAP_NET_ADMIN)
+#   mtu_discover=n  IP_MTU_DISCOVER/IPV6_MTU_DISCOVER, 0 = no hacer path MTU discovery (UDP masivo)
+#   fastopen=n      TCP_FASTOPEN: en bind es el largo de la cola, en connect lo activa (Linux)
+# más rcvbuf/sndbuf (ver set_buffers) y backlog en bind (el largo de la cola del listen)
+_OPTIONS = { # nombre: (nivel, opción, sólo TCP)
+    'nodelay':   (socket.IPPROTO_TCP, _const('TCP_NODELAY', 1), True),
+    'quickack':  (socket.IPPROTO_TCP, _const('TCP_QUICKACK', 12), True),
+    'busy_poll': (socket.SOL_SOCKET, _const('SO_BUSY_POLL', 46), False),
+}
+
+# antes de crear el socket, así un nombre mal escrito no deja un socket abierto
+def _check_options(opts):
+    for name in opts:
+        if name not in _OPTIONS and name not in ('mtu_discover', 'fastopen'):
+            raise TypeError(f'unknown socket option: {name}')
+
+def set_options(s, **opts):
+    _check_options(opts)
+    for name, value in opts.items():
+        if value is None:
+            continue
+        if name == 'mtu_discover':
+            if s.family == socket.AF_INET6:
+                level, opt = socket.IPPROTO_IPV6, _const('IPV6_MTU_DISCOVER', 23)
+            else:
+                level, opt = socket.IPPROTO_IP, _const('IP_MTU_DISCOVER', 10)
+        elif name == 'fastopen': # en un socket que va a conectar
+            if s.type != socket.SOCK_STREAM:
+                continue
+            level, opt = socket.IPPROTO_TCP, _const('TCP_FASTOPEN_CONNECT', 30)
+        else:
+            level, opt, tcp_only = _OPTIONS[name]
+            if tcp_only and s.type != socket.SOCK_STREAM:
+                continue
+        if opt is None: # no existe en esta plataforma
+            continue
+        try:
+            s.setsockopt(level, opt, int(value))
+        except socket.error as msg: # son sólo optimizaciones, no vale la pena fallar por esto
+            print(f'{name}: {msg}')
+
+def socket_tcp_bind(port, rcvbuf=None, sndbuf=None, **kw):
+    return socket_bind(socket.SOCK_STREAM, port, rcvbuf, sndbuf, **kw)
+
+def socket_udp_bind(port, rcvbuf=None, sndbuf=None, **kw):
+    return socket_bind(socket.SOCK_DGRAM, port, rcvbuf, sndbuf, **kw)
+
+def socket_bind(type, port, rcvbuf=None, sndbuf=None, backlog=5, fastopen=None, **opts):
+    _check_options(opts)
+    s = None
+    for res in socket.getaddrinfo(None, port, socket.AF_UNSPEC, type, 0, socket.AI_PASSIVE):
+        af, socktype, proto, canonname, sa = res
+        try:
+            s = socket.socket(af, socktype, proto)
+        except socket.error as msg:
+            s = None
+            continue
+        try:
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if(type == socket.SOCK_DGRAM):
+                s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            set_buffers(s, rcvbuf, sndbuf)
+            set_options(s, **opts)
+            s.bind(sa)
+            if(type == socket.SOCK_STREAM):
+                if fastopen and hasattr(socket, 'TCP_FASTOPEN'):
+                    try:
+                        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_FASTOPEN, fastopen)
+                    except socket.error as msg: # como en set_options: sin fastopen el servidor igual funciona
+                        print(f'fastopen: {msg}')
+                s.listen(backlog)
+        except socket.error as msg:
+            s.close()
+            s = None
+            print(msg)
+            break
+        break
+
+    return s
+
+def socket_tcp_connect(server, port, rcvbuf=None, sndbuf=None, **kw):
+    return socket_connect(socket.SOCK_STREAM, server, port, rcvbuf, sndbuf, **kw)
+
+def socket_udp_connect(server, port, rcvbuf=None, sndbuf=None, **kw):
+    return socket_connect(socket.SOCK_DGRAM, server, port, rcvbuf, sndbuf, **kw)
+
+#def socket_udp_unconnect(s):
+#    return s.connect((0, 0)) # no funciona con '' ni None ni 0
+
+# timeout: máximo de segundos para cada intento de connect (None: lo que demore el SO)
+# happy_eyeballs: (sólo TCP) en vez de probar las direcciones una tras otra, lanza un intento
+# nuevo cada attempt_delay segundos sin esperar al anterior (RFC 8305), alternando IPv6/IPv4,
+# y se queda con el primero que conecte. Así una IPv6 inalcanzable no bloquea hasta el timeout del SO
+# opts: opciones de tuning, ver set_options
+def socket_connect(type, server, port, rcvbuf=None, sndbuf=None, timeout=None, happy_eyeballs=False, attempt_delay=0.25, **opts):
+    _check_options(opts)
+    addrs = getaddrinfo(server, port, socket.AF_UNSPEC, type)
+    if happy_eyeballs and type == socket.SOCK_STREAM:
+        from .happy import happy_connect
+        return happy_connect(addrs, rcvbuf, sndbuf, timeout, attempt_delay, opts)
+
+    s = None
+    for res in addrs:
+        af, socktype, proto, canonname, sa = res
+        try:
+            s = socket.socket(af, socktype, proto)
+        except socket.error as msg:
+            s = None
+            continue
+        try:
+            set_buffers(s, rcvbuf, sndbuf)
+            set_options(s, **opts)
+            s.settimeout(timeout)
+            s.connect(sa)
+            s.settimeout(None)
+        except socket.error as msg:
+            s.close()
+            s = None
+            continue
+        break
+
+    return s
+
+# Se cargan al pedirlos: jsockets.ConnectionPool importa jsockets.pool, etc.
+_LAZY = {
+    'ConnectionPool': 'pool',
+    'is_alive': 'pool',
+    'socket_udp_multicast_bind': 'multicast',
+    'socket_udp_multicast_send': 'multicast',
+    'FrameDecoder': 'framing',
+    'send_msg': 'framing',
+    'send_msgs': 'framing',
+    'recv_msgs': 'framing',
+}
+_SUBMODULES = ('pool', 'multicast', 'happy', 'framing', 'profiling')
+
+def __getattr__(name):
+    import importlib
+    if name in _LAZY:
+        return getattr(importlib.import_module('.' + _LAZY[name], __name__), name)
+    if name in _SUBMODULES:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
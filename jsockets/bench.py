@@ -0,0 +1,116 @@
+# Microbenchmark de jsockets: cuánto cuesta crear, bindear y conectar sockets
+# Sirve para cuidar que los cambios al paquete no pongan más lento lo básico:
+#   python3 -m jsockets.bench --save base.json      # guarda una medición de referencia
+#   python3 -m jsockets.bench --compare base.json   # falla (exit 1) si algo empeoró más que --tolerance
+# Compara tiempos absolutos: la referencia hay que guardarla en la misma máquina
+# raw_socket (crear un socket sin jsockets) es el piso, sirve para ver cuánto agrega el paquete
+import argparse
+import json
+import socket
+import subprocess
+import sys
+import time
+import jsockets
+
+def _timeit(fn, n):
+    fn() # calentar
+    best = float('inf')
+    for rep in range(7): # el mejor de 7, el menos afectado por ruido
+        start = time.perf_counter()
+        for i in range(n):
+            fn()
+        best = min(best, (time.perf_counter() - start) / n)
+    return best * 1e6 # us por operación
+
+def bench_import():
+    cmd = [sys.executable, '-X', 'importtime', '-c', 'import jsockets']
+    best = float('inf')
+    for rep in range(5):
+        err = subprocess.run(cmd, capture_output=True, text=True).stderr
+        # sólo lo propio de jsockets (self), sin contar socket y los demás módulos estándar
+        own = [int(l.split('|')[0].split(':')[1]) for l in err.splitlines() if l.rstrip().endswith('jsockets')]
+        if own:
+            best = min(best, float(own[-1]))
+    return best
+
+def run(n):
+    srv = jsockets.socket_tcp_bind(0, backlog=1024)
+    port = srv.getsockname()[1]
+    udp = jsockets.socket_udp_bind(0)
+    uport = udp.getsockname()[1]
+
+    def tcp_bind():
+        jsockets.socket_tcp_bind(0).close()
+
+    def udp_bind():
+        jsockets.socket_udp_bind(0).close()
+
+    def tcp_connect():
+        s = jsockets.socket_tcp_connect('127.0.0.1', port)
+        conn, addr = srv.accept()
+        conn.close()
+        s.close()
+
+    def tcp_connect_happy():
+        s = jsockets.socket_tcp_connect('127.0.0.1', port, happy_eyeballs=True)
+        conn, addr = srv.accept()
+        conn.close()
+        s.close()
+
+    def udp_connect():
+        jsockets.socket_udp_connect('127.0.0.1', uport).close()
+
+    def udp_connect_opts():
+        jsockets.socket_udp_connect('127.0.0.1', uport, rcvbuf=1 << 20, sndbuf=1 << 20, mtu_discover=0).close()
+
+    def raw_socket():
+        socket.socket(socket.AF_INET, socket.SOCK_DGRAM).close()
+
+    results = {
+        'import': bench_import(),
+        'raw_socket': _timeit(raw_socket, n),
+        'tcp_bind': _timeit(tcp_bind, n),
+        'udp_bind': _timeit(udp_bind, n),
+        'tcp_connect': _timeit(tcp_connect, n),
+        'tcp_connect_happy': _timeit(tcp_connect_happy, n),
+        'udp_connect': _timeit(udp_connect, n),
+        'udp_connect_opts': _timeit(udp_connect_opts, n),
+    }
+    srv.close()
+    udp.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Microbenchmark de jsockets')
+    parser.add_argument('-n', type=int, default=500, help='Operaciones por medición')
+    parser.add_argument('--save', type=str, help='Guardar resultados en un JSON')
+    parser.add_argument('--compare', type=str, help='Comparar contra un JSON guardado con --save')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='Empeoramiento máximo aceptado (0.5 = 50%%)')
+    args = parser.parse_args()
+
+    results = run(args.n)
+    base = {}
+    if args.compare:
+        with open(args.compare) as f:
+            base = json.load(f)
+
+    worse = []
+    print(f'{"operación":>18} {"us/op":>10} {"base":>10} {"cambio":>8}')
+    for name, us in results.items():
+        line = f'{name:>18} {us:>10.1f}'
+        if name in base:
+            change = us / base[name] - 1
+            line += f' {base[name]:>10.1f} {100*change:>+7.1f}%'
+            if change > args.tolerance:
+                worse.append(name)
+        print(line)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if worse:
+        print(f'Empeoraron más de {100*args.tolerance:.0f}%: {", ".join(worse)}')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
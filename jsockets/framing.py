@@ -0,0 +1,51 @@
+# Mensajes con largo para TCP: 4 bytes (big endian) con el largo, y luego los datos
+# TCP es un stream: un recv puede traer medio mensaje o varios juntos, FrameDecoder los vuelve a separar
+# Así un cliente puede mandar muchos mensajes seguidos (pipelining) sin esperar cada respuesta
+import struct
+from . import BUFSIZE
+
+HEADER = struct.Struct('!I')
+MAX_MSG = 16*1024*1024 # un largo mayor es casi seguro basura en el stream
+
+def frame(data):
+    return HEADER.pack(len(data)) + data
+
+def send_msg(s, data):
+    s.sendall(frame(data))
+
+def send_msgs(s, msgs): # varios mensajes en un solo send
+    s.sendall(b''.join(frame(m) for m in msgs))
+
+class FrameDecoder:
+    def __init__(self, max_size=MAX_MSG):
+        self.max_size = max_size
+        self._buf = bytearray()
+
+    def pending(self): # bytes de un mensaje incompleto
+        return len(self._buf)
+
+    def feed(self, data): # retorna la lista de mensajes completos
+        self._buf += data
+        msgs = []
+        pos = 0
+        while len(self._buf) - pos >= HEADER.size:
+            n, = HEADER.unpack_from(self._buf, pos)
+            if n > self.max_size:
+                raise ValueError(f'message too long: {n} bytes')
+            if len(self._buf) - pos - HEADER.size < n:
+                break
+            pos += HEADER.size
+            msgs.append(bytes(self._buf[pos:pos+n]))
+            pos += n
+        del self._buf[:pos] # se corre una sola vez por feed, no por mensaje
+        return msgs
+
+# lee del socket hasta tener al menos un mensaje; None en EOF
+def recv_msgs(s, decoder, size=BUFSIZE):
+    while True:
+        data = s.recv(size)
+        if not data:
+            return None
+        msgs = decoder.feed(data)
+        if msgs:
+            return msgs
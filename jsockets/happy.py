@@ -0,0 +1,75 @@
+# Happy eyeballs (RFC 8305) para socket_connect(..., happy_eyeballs=True)
+import socket
+import time
+import select
+import errno
+from . import set_buffers, set_options
+
+# orden de RFC 8305: alternar familias, partiendo por la que prefiere getaddrinfo
+def interleave(addrs):
+    if not addrs:
+        return []
+    first = [a for a in addrs if a[0] == addrs[0][0]]
+    rest = [a for a in addrs if a[0] != addrs[0][0]]
+    out = []
+    for i in range(max(len(first), len(rest))):
+        out += first[i:i+1] + rest[i:i+1]
+    return out
+
+def happy_connect(addrs, rcvbuf, sndbuf, timeout, attempt_delay, opts):
+    addrs = interleave(addrs)
+    pending = {} # socket -> hora límite de ese intento
+    winner = None
+    next_try = time.monotonic()
+    while winner is None and (addrs or pending):
+        now = time.monotonic()
+        if addrs and (now >= next_try or not pending): # lanzo otro intento
+            af, socktype, proto, canonname, sa = addrs.pop(0)
+            try:
+                s = socket.socket(af, socktype, proto)
+            except socket.error:
+                continue
+            try:
+                set_buffers(s, rcvbuf, sndbuf)
+                set_options(s, **opts)
+                s.setblocking(False)
+            except socket.error:
+                s.close()
+                continue
+            except BaseException: # p.ej. TypeError de una opción desconocida: no dejo el socket abierto
+                s.close()
+                for p in pending:
+                    p.close()
+                raise
+            err = s.connect_ex(sa)
+            if err == 0:
+                winner = s
+            elif err in (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN):
+                pending[s] = now + timeout if timeout is not None else float('inf')
+                next_try = now + attempt_delay
+            else:
+                s.close() # falló al tiro: el siguiente no espera
+            continue
+
+        wait = min(pending.values())
+        if addrs:
+            wait = min(wait, next_try)
+        socks = list(pending)
+        _, w, x = select.select([], socks, socks, max(0.0, min(wait - now, 3600)))
+        now = time.monotonic()
+        for s in set(w + x):
+            del pending[s]
+            if winner is None and s.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+                winner = s
+            else:
+                s.close()
+                next_try = now # un intento fallido adelanta el siguiente
+        for s in [s for s, t in pending.items() if t <= now]:
+            del pending[s]
+            s.close()
+
+    for s in pending: # perdieron la carrera
+        s.close()
+    if winner is not None:
+        winner.setblocking(True)
+    return winner
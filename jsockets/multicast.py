@@ -0,0 +1,64 @@
+# Multicast para jsockets
+import socket
+import struct
+from . import getaddrinfo, set_buffers, set_options, _LINUX
+
+# Multicast: un solo envío le llega a todos los que se unieron al grupo
+# (ej: 239.1.2.3 en IPv4 o ff15::1234 en IPv6)
+# iface: la interfaz a usar, su dirección IPv4 o su nombre/índice en IPv6 (None: la que elija el SO)
+def _multicast_group(group, port):
+    af, socktype, proto, canonname, sa = getaddrinfo(group, port, socket.AF_UNSPEC, socket.SOCK_DGRAM)[0]
+    return af, sa
+
+def _ifindex(iface):
+    if iface is None:
+        return 0
+    return iface if isinstance(iface, int) else socket.if_nametoindex(iface)
+
+def socket_udp_multicast_bind(group, port, iface=None, rcvbuf=None, **opts):
+    af, sa = _multicast_group(group, port)
+    s = socket.socket(af, socket.SOCK_DGRAM)
+    try:
+        # varios receptores en la misma máquina comparten el port
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, 'SO_REUSEPORT'):
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        set_buffers(s, rcvbuf, None)
+        set_options(s, **opts)
+        # en Linux hacer bind a la dirección del grupo filtra los otros grupos del mismo port
+        s.bind((sa[0] if _LINUX else '', port) + sa[2:])
+        if af == socket.AF_INET6:
+            mreq = socket.inet_pton(af, sa[0]) + struct.pack('@I', _ifindex(iface))
+            s.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_JOIN_GROUP, mreq)
+        else:
+            mreq = socket.inet_aton(sa[0]) + socket.inet_aton(iface or '0.0.0.0')
+            s.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+    except socket.error as msg:
+        s.close()
+        print(msg)
+        return None
+    return s
+
+# ttl: cuántos routers puede cruzar (1: sólo la red local), loop: si me llegan mis propios envíos
+def socket_udp_multicast_send(group, port, ttl=1, loop=True, iface=None, sndbuf=None, **opts):
+    af, sa = _multicast_group(group, port)
+    s = socket.socket(af, socket.SOCK_DGRAM)
+    try:
+        set_buffers(s, None, sndbuf)
+        set_options(s, **opts)
+        if af == socket.AF_INET6:
+            s.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_MULTICAST_HOPS, ttl)
+            s.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_MULTICAST_LOOP, int(loop))
+            if iface is not None:
+                s.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_MULTICAST_IF, _ifindex(iface))
+        else:
+            s.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+            s.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, int(loop))
+            if iface is not None:
+                s.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(iface))
+        s.connect(sa) # así se puede usar send() como con socket_udp_connect
+    except socket.error as msg:
+        s.close()
+        print(msg)
+        return None
+    return s
@@ -0,0 +1,78 @@
+# Pool de conexiones para jsockets
+import socket
+import time
+import threading
+from . import socket_tcp_connect
+
+# Health check para conexiones TCP que estuvieron sin usar:
+# está viva si no tiene error pendiente, ni EOF, ni datos que nadie pidió
+def is_alive(s):
+    try:
+        if s.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) != 0:
+            return False
+        timeout = s.gettimeout()
+        s.setblocking(False)
+        try:
+            s.recv(1, socket.MSG_PEEK)
+        finally:
+            s.settimeout(timeout)
+    except BlockingIOError:
+        return True # nada que leer: está esperando, como debe ser
+    except OSError:
+        return False
+    return False
+
+# Pool de conexiones TCP ociosas por (server, port)
+# get() reusa una conexión viva si hay (sin DNS ni handshake), si no, conecta una nueva con socket_tcp_connect(**kw)
+# put() la devuelve; se guardan a lo más max_idle por destino y se cierran al pasar idle_timeout
+class ConnectionPool:
+    def __init__(self, max_idle=4, idle_timeout=30.0, **kw):
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.connect_args = kw # se pasan a socket_tcp_connect
+        self.hits = 0
+        self.misses = 0
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def get(self, server, port):
+        key = (server, str(port))
+        while True:
+            with self._lock:
+                conns = self._idle.get(key)
+                if not conns:
+                    break
+                s, t = conns.pop() # la más reciente primero, es la más probable de estar viva
+            if time.monotonic() - t < self.idle_timeout and is_alive(s):
+                self.hits += 1
+                return s
+            s.close()
+        self.misses += 1
+        return socket_tcp_connect(server, port, **self.connect_args)
+
+    def put(self, s, server, port):
+        key = (server, str(port))
+        with self._lock:
+            conns = self._idle.setdefault(key, [])
+            conns.append((s, time.monotonic()))
+            if len(conns) <= self.max_idle:
+                return
+            s, t = conns.pop(0) # sobra la más vieja
+        s.close()
+
+    def evict(self): # cierra las conexiones que pasaron idle_timeout
+        now = time.monotonic()
+        old = []
+        with self._lock:
+            for key, conns in self._idle.items():
+                old += [s for s, t in conns if now - t >= self.idle_timeout]
+                conns[:] = [(s, t) for s, t in conns if now - t < self.idle_timeout]
+        for s in old:
+            s.close()
+
+    def close(self):
+        with self._lock:
+            conns = [s for l in self._idle.values() for s, t in l]
+            self._idle.clear()
+        for s in conns:
+            s.close()
@@ -0,0 +1,84 @@
+# Profiling de los clientes (HW/T1/bwc-sw.py, HW/T3/bwc-sr.py): --profile, --profile-mode, --trace-phases
+# profiled() corre una función bajo cProfile o bajo SamplingProfiler, y PhaseTimer mide cuánto
+# demora cada fase (handshake, transferencia, cierre)
+import sys
+import os
+import time
+import threading
+import collections
+import contextlib
+
+# Profiler de bajo costo (tiempo de reloj): cada interval segundos toma el stack del thread que lo creó
+# y lo cuenta. También muestra el tiempo bloqueado, ej: esperando en recv.
+# La salida es en formato collapsed, una línea 'frame;frame;... cuenta' por stack (entrada de flamegraph.pl)
+class SamplingProfiler(threading.Thread):
+    def __init__(self, interval=0.001):
+        threading.Thread.__init__(self, daemon=True)
+        self.interval = interval
+        self.target = threading.get_ident()
+        self.stacks = collections.Counter()
+        self.done = threading.Event()
+
+    def run(self):
+        while not self.done.wait(self.interval):
+            frame = sys._current_frames().get(self.target)
+            stack = []
+            while frame is not None:
+                stack.append(f'{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)})')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self.done.set()
+        self.join()
+
+    def dump(self, fileout):
+        with open(fileout, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+# Corre fn(*args) bajo el profiler pedido en flags (profile: archivo de salida o None,
+# profile_mode: 'cprofile' o 'sample', profile_interval: ms entre muestras) y retorna lo que retorne fn
+def profiled(flags, fn, *args):
+    if not flags.profile:
+        return fn(*args)
+    if flags.profile_mode == 'sample':
+        sampler = SamplingProfiler(flags.profile_interval/1000)
+        sampler.start()
+        try:
+            return fn(*args)
+        finally:
+            sampler.stop()
+            sampler.dump(flags.profile)
+            print(f'{sum(sampler.stacks.values())} samples ({len(sampler.stacks)} stacks) written to {flags.profile}', file=sys.stderr)
+    import cProfile, pstats # sólo si se pide
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(fn, *args)
+    finally:
+        profiler.dump_stats(flags.profile)
+        pstats.Stats(flags.profile, stream=sys.stderr).sort_stats('cumulative').print_stats(15)
+        print(f'cProfile stats written to {flags.profile}', file=sys.stderr)
+
+# Tiempo de reloj de cada fase de una ejecución, se muestra en stderr sólo si enabled (--trace-phases)
+#   phase = PhaseTimer(True)
+#   with phase('handshake'): ...
+#   phase.report()
+class PhaseTimer:
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.phases = []
+
+    @contextlib.contextmanager
+    def __call__(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def report(self):
+        if self.enabled:
+            total = sum(t for name, t in self.phases)
+            for name, t in self.phases:
+                print(f'phase {name:<9} {1000*t:10.3f} ms {100*t/total if total else 0:5.1f}%', file=sys.stderr)